@@ -4,11 +4,18 @@
 # License:GPL
 # Email:huangtao.sh@icloud.com
 # 创建：2025-08-01 19:27
+# 修订：2026-10-17 17:47 新增 iter_workbooks、read_excels，多进程并行读取多个 Excel 文件
+# 修订：2026-10-17 17:51 新增 XlsxReader、read_xlsx，不依赖 xlrd3 流式读取 xlsx 文件
+# 修订：2026-10-17 17:52 read_excel 在读取时处理选取列、跳过行及读取行数，缓存列名解析结果
 
+import posixpath
+import time
+import zipfile
 from contextlib import suppress
-from itertools import chain
-from operator import itemgetter
-from typing import Callable, Iterable, Literal, Optional, Union
+from functools import lru_cache
+from itertools import chain, islice
+from typing import Callable, Iterable, Iterator, Literal, Optional, Union
+from xml.etree.ElementTree import iterparse
 
 from xlrd3 import Book, open_workbook, xldate_as_tuple
 
@@ -27,6 +34,7 @@ def conv_date(d, fmt: Literal["date", "time", "datetime"] = "date"):
     return d
 
 
+@lru_cache(maxsize=1024)
 def colname2idx(col_str: str) -> int:
     "将列名转换成序号"
     col_str = col_str.upper()
@@ -47,24 +55,312 @@ def IterCols(col_str: str) -> Iterable:
             yield colname2idx(col)
 
 
+@lru_cache(maxsize=256)
+def usecols_index(usecols: str) -> tuple[int, ...]:
+    "将列名表达式转换成列序号，结果按表达式缓存"
+    return tuple(IterCols(usecols))
+
+
 def proc_data(
-    data: list,  # 原始数据
+    data: Iterable,  # 原始数据
     usecols: str = "",  # 选取列
     converter: Optional[Callable[[list], list]] = None,  # 按行转换程序
     skiprows: int = 0,  # 跳过行
     nrows: int = 0,  # 读取行数
 ) -> Iterable:
-    "对数据进行整理"
-    if skiprows:
-        data = data[skiprows:]
-    if usecols:
-        data = map(itemgetter(*IterCols(usecols)), data)
+    """
+    对数据进行整理，先截取行再选取列。未指定 converter 时，读取 nrows 行即停止；
+    否则 nrows 为转换后的有效行数
+    """
+    stop = skiprows + nrows if nrows and not converter else None
+    if skiprows or stop:
+        data = islice(data, skiprows, stop)
+    if usecols:  # 与 read_xlsx 一致，选取列后仍返回列表，便于 converter 修改
+        cols = usecols_index(usecols)
+        data = ([row[i] for i in cols] for row in data)
     if converter:
         data = filter(None, map(converter, data))
-    if nrows:
-        return (d for i, d in zip(range(nrows), data))
-    else:
-        return data
+        if nrows:
+            data = islice(data, nrows)
+    return data
+
+
+def iter_sheets(book: Book, sheets: Union[str, int, list, None] = None):
+    """
+    按工作表名或序号逐个加载工作表，sheets 为空时加载全部工作表，
+    按需打开（on_demand=True）的工作簿，读取后即释放工作表
+    """
+    if sheets is None:
+        sheets = range(book.nsheets)
+    elif isinstance(sheets, (str, int)):
+        sheets = [sheets]
+    for sheet in sheets:
+        if isinstance(sheet, int):
+            sheet = book.sheet_by_index(sheet)
+        else:
+            sheet = book.sheet_by_name(sheet)
+        yield sheet
+        if book.on_demand:
+            book.unload_sheet(sheet.name)
+
+
+def _read_book(
+    path: str, sheets: Union[str, int, list, None], usecols: str, skiprows: int
+) -> tuple[list, float]:
+    "在子进程中读取工作簿，仅加载指定的工作表，返回：[(工作表名, 数据)] 及读取时间"
+    start = time.perf_counter()
+    with open_workbook(path, on_demand=True) as book:
+        result = [
+            (sheet.name, list(proc_data(sheet._cell_values, usecols, None, skiprows)))
+            for sheet in iter_sheets(book, sheets)
+        ]
+    return result, time.perf_counter() - start
+
+
+def iter_workbooks(
+    paths: Iterable,  # Excel 文件清单
+    sheets: Union[str, int, list, None] = None,  # 工作表名或序号
+    usecols: str = "",  # 选取列
+    skiprows: int = 0,  # 跳过行
+    workers: Optional[int] = None,  # 进程数，默认为 CPU 核数
+    ordered: bool = True,  # 是否按文件顺序返回，否则按读取完成的顺序返回
+) -> Iterable[tuple[Path, list, float]]:
+    """
+    多进程并行读取多个 Excel 文件，每个文件由一个进程按需加载指定的工作表，
+    选取列及跳过行在子进程中处理。每读取完成一个文件即返回：
+    文件、[(工作表名, 数据)]、读取时间
+    """
+    from orange.utils.htutil import pool_starmap
+
+    tasks = ((str(path), sheets, usecols, skiprows) for path in paths)
+    for (path, *_), (data, read_time) in pool_starmap(
+        _read_book, tasks, workers, ordered
+    ):
+        yield Path(path), data, read_time
+
+
+def read_excels(
+    paths: Iterable,  # Excel 文件清单
+    sheets: Union[str, int, list, None] = None,  # 工作表名或序号
+    usecols: str = "",  # 选取列
+    converter: Optional[Callable[[list], list]] = None,  # 按行转换程序
+    skiprows: int = 0,  # 跳过行
+    nrows: int = 0,  # 每个工作表读取行数
+    workers: Optional[int] = None,  # 进程数，默认为 CPU 核数
+    ordered: bool = True,  # 是否按文件顺序返回
+    print_result: bool = False,  # 是否打印每个文件的读取时间
+) -> Iterable:
+    """
+    多进程并行读取多个 Excel 文件，参数同 read_excel，逐行返回数据。
+    converter 在当前进程中执行，可为 lambda 等不能在进程间传递的函数
+    """
+    for path, data, read_time in iter_workbooks(
+        paths, sheets, usecols, skiprows, workers, ordered
+    ):
+        if print_result:
+            count = sum(len(rows) for _, rows in data)
+            print(f"{path.name}：{count:,d} 行，读取 {read_time:.2f} 秒")
+        for _, rows in data:
+            yield from proc_data(rows, converter=converter, nrows=nrows)
+
+
+_REL_NS = "{http://schemas.openxmlformats.org/officeDocument/2006/relationships}"
+
+
+def _local(tag: str) -> str:
+    "去除标签的命名空间"
+    return tag.rpartition("}")[2]
+
+
+def _cellref(ref: str) -> tuple[int, int]:
+    "将单元格位置转换成列、行序号，如：B3 -> (1, 2)"
+    i = len(ref.rstrip("0123456789"))
+    return colname2idx(ref[:i]), int(ref[i:]) - 1
+
+
+class SharedStrings:
+    "共享字符串，按需解析，仅解析至需要的序号"
+
+    def __init__(self, file):
+        self._items: list[str] = []
+        self._iter = self._parse(file) if file else iter(())
+
+    @staticmethod
+    def _parse(file) -> Iterator[str]:
+        parser = iterparse(file, events=("start", "end"))
+        root = None
+        for event, elem in parser:
+            if root is None:
+                root = elem
+            elif event == "end" and _local(elem.tag) == "si":
+                # 忽略注音（rPh）中的文字
+                yield "".join(
+                    t.text or ""
+                    for child in elem
+                    if _local(child.tag) in ("t", "r")
+                    for t in child.iter()
+                    if _local(t.tag) == "t"
+                )
+                root.clear()
+
+    def __getitem__(self, index: int) -> str:
+        items = self._items
+        while len(items) <= index:
+            items.append(next(self._iter))
+        return items[index]
+
+
+class XlsxReader:
+    """
+    不依赖 xlrd3，使用 zipfile 及 iterparse 逐行读取 xlsx 文件，内存占用与文件大小无关。
+    用法：
+    with XlsxReader(path) as reader:
+        for row in reader.rows(0, usecols="A:C", skiprows=1):
+            ...
+    返回的数据格式与 xlrd3 一致：数字为 float，空单元格为 ""
+    """
+
+    def __init__(self, path: Union[str, Path]):
+        self.zip = zipfile.ZipFile(str(path))
+        self._strings = None
+        self._sheets = self._read_sheets()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        self.zip.close()
+
+    def _read_sheets(self) -> dict[str, str]:
+        "读取工作表名及其对应的文件"
+        targets = {}
+        with self.zip.open("xl/_rels/workbook.xml.rels") as f:
+            for _, elem in iterparse(f):
+                if _local(elem.tag) == "Relationship":
+                    target = elem.get("Target")
+                    if target.startswith("/"):
+                        target = target[1:]
+                    else:
+                        target = posixpath.normpath(posixpath.join("xl", target))
+                    targets[elem.get("Id")] = target
+        sheets = {}
+        with self.zip.open("xl/workbook.xml") as f:
+            for _, elem in iterparse(f):
+                if _local(elem.tag) == "sheet":
+                    sheets[elem.get("name")] = targets[elem.get(f"{_REL_NS}id")]
+        return sheets
+
+    @property
+    def sheet_names(self) -> list[str]:
+        return list(self._sheets)
+
+    @property
+    def strings(self) -> SharedStrings:
+        if self._strings is None:
+            name = "xl/sharedStrings.xml"
+            exists = name in self.zip.NameToInfo
+            self._strings = SharedStrings(self.zip.open(name) if exists else None)
+        return self._strings
+
+    def _value(self, cell) -> Union[str, float, int]:
+        "解析单元格的值"
+        type_ = cell.get("t", "n")
+        if type_ == "inlineStr":
+            return "".join(t.text or "" for t in cell.iter() if _local(t.tag) == "t")
+        value = None
+        for child in cell:
+            if _local(child.tag) == "v":
+                value = child.text
+                break
+        if value is None:
+            return ""
+        if type_ == "n":
+            return float(value)
+        elif type_ == "s":
+            return self.strings[int(value)]
+        elif type_ == "b":
+            return int(value)
+        return value  # str、e、d 等类型直接返回文本
+
+    def rows(
+        self,
+        sheet: Union[str, int] = 0,  # 工作表名或序号
+        usecols: str = "",  # 选取列，如 "A,C:E"
+        skiprows: int = 0,  # 跳过行
+        nrows: int = 0,  # 读取行数
+    ) -> Iterator[list]:
+        """
+        逐行读取工作表，空行亦返回，以保持与 xlrd3 相同的行号。
+        跳过的行、未选取的列均不解析单元格的值
+        """
+        if isinstance(sheet, int):
+            sheet = self.sheet_names[sheet]
+        cols = usecols_index(usecols) if usecols else None
+        wanted = set(cols) if cols else None
+        rows = self._rows(self._sheets[sheet], wanted, skiprows)
+        if cols:
+            rows = ([row[c] if c < len(row) else "" for c in cols] for row in rows)
+        return islice(rows, nrows) if nrows else rows
+
+    def _rows(self, name: str, wanted: Optional[set], skiprows: int):
+        width, rowidx = 0, 0
+        with self.zip.open(name) as f:
+            parser = iterparse(f, events=("start", "end"))
+            sheet_data = None
+            for event, elem in parser:
+                tag = _local(elem.tag)
+                if event == "start":
+                    if tag == "sheetData":
+                        sheet_data = elem
+                    elif tag == "dimension" and ":" in (ref := elem.get("ref", "")):
+                        width = _cellref(ref.split(":")[1])[0] + 1
+                    continue
+                if tag != "row":
+                    continue
+                r = int(elem.get("r", rowidx + 1)) - 1
+                while rowidx < r:  # 补足空行
+                    if rowidx >= skiprows:
+                        yield [""] * width
+                    rowidx += 1
+                if rowidx >= skiprows:
+                    row = [""] * width
+                    for col, cell in enumerate(elem):
+                        if ref := cell.get("r"):
+                            col = _cellref(ref)[0]
+                        if wanted is not None and col not in wanted:
+                            continue
+                        if col >= len(row):
+                            row.extend([""] * (col + 1 - len(row)))
+                        row[col] = self._value(cell)
+                    yield row
+                rowidx += 1
+                if sheet_data is not None:
+                    sheet_data.clear()  # 释放已读取的行
+
+
+def read_xlsx(
+    path: Union[str, Path],  # xlsx 文件
+    sheets: Union[str, int, list, None] = 0,  # 工作表名或序号，为空时读取全部工作表
+    usecols: str = "",  # 选取列
+    converter: Optional[Callable[[list], list]] = None,  # 按行转换程序
+    skiprows: int = 0,  # 跳过行
+    nrows: int = 0,  # 每个工作表读取行数
+) -> Iterator:
+    """
+    流式读取 xlsx 文件，参数同 read_excel。选取列、跳过行及读取行数在解析时处理，
+    未指定 converter 时，读取 nrows 行后即停止解析
+    """
+    with XlsxReader(path) as reader:
+        if sheets is None:
+            sheets = reader.sheet_names
+        elif isinstance(sheets, (str, int)):
+            sheets = [sheets]
+        for sheet in sheets:
+            rows = reader.rows(sheet, usecols, skiprows, 0 if converter else nrows)
+            yield from proc_data(rows, converter=converter, nrows=nrows)
 
 
 def conv(row):
@@ -78,37 +374,25 @@ def read_excel(
     usecols: str = "",  # 选取列
     converter: Optional[Callable[[list], list]] = None,  # 按行转换程序
     skiprows: int = 0,  # 跳过行
-    nrows: int = 0,  # 读取行数
+    nrows: int = 0,  # 每个工作表读取行数
 ) -> Iterable:
+    """
+    读取 Excel 文件，sheets 为空时读取全部工作表。xlsx 文件使用 read_xlsx 流式读取，
+    跳过的行、未选取的列不解析，读取 nrows 行后即停止；
+    其他文件使用 xlrd3 仅加载指定的工作表
+    """
     if isinstance(io, (str, Path)):
-        with open_workbook(Path(io)) as book:
-            return read_excel(book, sheets, usecols, converter, skiprows, nrows)
+        if str(io).lower().endswith((".xlsx", ".xlsm")):
+            return read_xlsx(io, sheets, usecols, converter, skiprows, nrows)
+        with open_workbook(str(io), on_demand=True) as book:
+            data = [sheet._cell_values for sheet in iter_sheets(book, sheets)]
     elif isinstance(io, Book):
-        if isinstance(sheets, int):
-            sheet = io.sheet_by_index(sheets)
-            data = sheet._cell_values
-            return proc_data(data, usecols, converter, skiprows, nrows)
-    elif isinstance(sheets, int):
-        sheet = io.sheet_by_name(sheets)
-        return proc_data(
-            sheet._cell_values, usecols, converter, skiprows, nrows
-        )
-    elif isinstance(sheets, Iterable):
-        return chain(
-            *(
-                read_excel(sheet, usecols, converter, skiprows, nrows)
-                for sheet in sheets
-            )
-        )
-    elif sheets is None:
-        return chain(
-            *(
-                proc_data(
-                    sheet._cell_values, usecols, converter, skiprows, nrows
-                )
-                for sheet in io.sheets()
-            )
-        )
+        data = (sheet._cell_values for sheet in iter_sheets(io, sheets))
+    else:
+        raise Exception(f"不支持的文件类型：{type(io)}")
+    return chain.from_iterable(
+        proc_data(rows, usecols, converter, skiprows, nrows) for rows in data
+    )
 
 
 if __name__ == "__main__":
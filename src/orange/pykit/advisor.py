@@ -0,0 +1,312 @@
+# 项目：标准库
+# 模块：索引分析
+# 作者：黄涛
+# License:GPL
+# Email:huangtao.sh@icloud.com
+# 创建：2026-10-17 17:38
+
+"""
+根据实际执行的 sql 语句，分析执行计划中的全表扫描，建议需要建立的索引，
+并在抽样复制的数据库中比较建立索引前后的执行时间
+"""
+
+import re
+import sqlite3
+import time
+from contextlib import closing, suppress
+from dataclasses import dataclass, field
+from typing import Iterable, Optional, Union
+
+from orange import Path, arg, command
+from orange.sqlite import Connection, Profiler, connect
+
+_KEYWORDS = {
+    "where",
+    "set",
+    "join",
+    "on",
+    "left",
+    "right",
+    "inner",
+    "outer",
+    "cross",
+    "natural",
+    "order",
+    "group",
+    "limit",
+    "union",
+    "using",
+    "indexed",
+    "not",
+}
+_TablePattern = re.compile(
+    r"\b(?:from|join|update)\s+([\w.]+)(?:\s+(?:as\s+)?(\w+))?", re.I
+)
+_ScanPattern = re.compile(r"^SCAN (?:TABLE )?(\w+)(?: AS (\w+))?$")
+_WherePattern = re.compile(r"\b(?:where|on)\b", re.I)
+_PredicatePattern = re.compile(
+    r"(?:\b(\w+)\.)?\b(\w+)\s*(==|=|>=|<=|>|<|\bin\b|\bis\b|\bbetween\b|\blike\b)",
+    re.I,
+)
+_EQ_OPS = {"=", "==", "in", "is"}
+
+
+@dataclass
+class Advice:
+    table: str  # 表名
+    columns: tuple[str, ...]  # 建议建立索引的列
+    queries: list[str] = field(default_factory=list)  # 全表扫描的语句
+    before: Optional[float] = None  # 建立索引前的执行时间，单位：秒
+    after: Optional[float] = None  # 建立索引后的执行时间，单位：秒
+
+    @property
+    def name(self) -> str:
+        return f"{self.table}_{'_'.join(self.columns)}"
+
+    @property
+    def sql(self) -> str:
+        "建立索引的语句"
+        return (
+            f"create index if not exists {self.name} "
+            f"on {self.table}({','.join(self.columns)})"
+        )
+
+
+def split_sql(text: str) -> Iterable[str]:
+    "将 sql 脚本拆分成单条语句"
+    stmt = ""
+    for line in text.splitlines(keepends=True):
+        stmt += line
+        if sqlite3.complete_statement(stmt):
+            if stmt := stmt.strip().rstrip(";").strip():
+                yield stmt
+            stmt = ""
+    if stmt := stmt.strip():
+        yield stmt
+
+
+def dummy_params(sql: str) -> Union[list, dict]:
+    "生成执行计划所需的参数，值均为 NULL"
+    if names := re.findall(r"[:@$](\w+)", sql):
+        return dict.fromkeys(names)
+    return [None] * sql.count("?")
+
+
+class IndexAdvisor:
+    """
+    索引分析，使用方法：
+    advisor = IndexAdvisor(db)              # 或 IndexAdvisor(tables=[Table1, Table2])
+    advisor.add(sql1, sql2)                 # 或 add_file、add_profiler
+    advices = advisor.analyze()
+    advisor.benchmark(advices, sample=100000)
+    advisor.report(advices)
+    """
+
+    def __init__(
+        self, db: Optional[Connection] = None, tables: Iterable[type] = ()
+    ):
+        """
+        db:     需要分析的数据库，为空时根据 tables 建立内存数据库，仅分析执行计划
+        tables: Table 类的清单，用于提示应设置 has_index 的列
+        """
+        self.tables = {table.tablename: table for table in tables}
+        if db is None:
+            db = connect(":memory:")
+            for table in self.tables.values():
+                table.create_table(db)
+        self.db = db
+        self.workload: list[str] = []
+
+    def add(self, *sqls: str):
+        "添加需要分析的语句"
+        self.workload.extend(sql for sql in sqls if sql not in self.workload)
+
+    def add_file(self, path: Union[str, Path]):
+        "从文件中读取语句，语句之间以 ; 分隔"
+        self.add(*split_sql(Path(path).text))
+
+    def add_profiler(self, profiler: Profiler):
+        "添加 Profiler 记录的查询及更新语句"
+        self.add(*(s.sql for s in profiler.stats.values() if s.kind != "load"))
+
+    def plan(self, sql: str, db: Optional[Connection] = None) -> list[str]:
+        "获取语句的执行计划"
+        db = db or self.db
+        cur = db.execute(f"explain query plan {sql}", dummy_params(sql))
+        with closing(cur):
+            return [row[-1] for row in cur]
+
+    def columns(self, table: str) -> list[str]:
+        "获取表的列名"
+        return [row[1] for row in self.db.fetch(f"pragma table_info({table})")]
+
+    def full_scans(self, sql: str) -> list[str]:
+        "返回语句中全表扫描的表名"
+        aliases = {}
+        for table, alias in _TablePattern.findall(sql):
+            table = table.split(".")[-1]
+            aliases[table.lower()] = table
+            if alias and alias.lower() not in _KEYWORDS:
+                aliases[alias.lower()] = table
+        tables = []
+        for detail in self.plan(sql):
+            if " USING " in detail or not (match := _ScanPattern.match(detail)):
+                continue
+            name = (match.group(2) or match.group(1)).lower()
+            if (table := aliases.get(name, match.group(1))) not in tables:
+                tables.append(table)
+        return tables
+
+    def index_columns(self, sql: str, table: str) -> tuple[str, ...]:
+        "根据条件语句推测索引列：等值条件的列在前，范围条件的列在后"
+        names = {table.lower()}
+        for name, alias in _TablePattern.findall(sql):
+            if name.split(".")[-1].lower() == table.lower() and alias:
+                names.add(alias.lower())
+        columns = {c.lower(): c for c in self.columns(table)}
+        if not (match := _WherePattern.search(sql)):
+            return ()
+        eqs, ranges = [], []
+        for prefix, column, op in _PredicatePattern.findall(sql[match.end() :]):
+            if prefix and prefix.lower() not in names:
+                continue
+            if not (column := columns.get(column.lower())):
+                continue
+            target = eqs if op.lower() in _EQ_OPS else ranges
+            if column not in eqs and column not in ranges:
+                target.append(column)
+        return tuple(eqs + ranges[:1])
+
+    def analyze(self) -> list[Advice]:
+        "分析所有语句，返回建议建立的索引"
+        advices: dict[tuple, Advice] = {}
+        for sql in self.workload:
+            try:
+                tables = self.full_scans(sql)
+            except sqlite3.Error as e:
+                print(f"语句执行失败：{e}\n{sql}")
+                continue
+            for table in tables:
+                if columns := self.index_columns(sql, table):
+                    key = table, columns
+                    advice = advices.setdefault(key, Advice(table, columns))
+                    advice.queries.append(sql)
+        # 如某个索引是另一个索引的前缀，则合并至较长的索引
+        result = sorted(advices.values(), key=lambda a: -len(a.columns))
+        merged: list[Advice] = []
+        for advice in result:
+            for other in merged:
+                if (
+                    other.table == advice.table
+                    and other.columns[: len(advice.columns)] == advice.columns
+                ):
+                    other.queries.extend(advice.queries)
+                    break
+            else:
+                merged.append(advice)
+        return merged
+
+    def sample(self, size: int = 100000) -> Connection:
+        "复制数据库，每张表最多保留 size 行"
+        target = connect(":memory:")
+        file = next(
+            (row[2] for row in self.db.fetch("pragma database_list") if row[1] == "main"),
+            "",
+        )
+        if file:
+            target.execute("attach database ? as src", [file])
+            schema = target.fetch(
+                "select type,name,sql from src.sqlite_master "
+                "where sql is not null and name not like 'sqlite_%' "
+                "order by type='index'"
+            )
+            for type_, name, sql in schema:
+                if type_ in ("table", "index"):
+                    target.execute(sql)
+                if type_ == "table":
+                    target.execute(
+                        f"insert into main.{name} select * from src.{name} limit ?",
+                        [size],
+                    )
+            target.commit()
+            target.execute("detach database src")
+        else:
+            self.db.backup(target)
+            tables = target.fetch(
+                "select name from sqlite_master "
+                "where type='table' and name not like 'sqlite_%'"
+            )
+            for (name,) in tables:
+                with suppress(sqlite3.Error):
+                    target.execute(
+                        f"delete from {name} where rowid not in "
+                        f"(select rowid from {name} limit ?)",
+                        [size],
+                    )
+            target.commit()
+        return target
+
+    @staticmethod
+    def timeit(db: Connection, sql: str, repeat: int = 3) -> float:
+        "执行语句，返回最短的执行时间，更新语句执行后回滚"
+        best = None
+        params = dummy_params(sql)
+        for _ in range(repeat):
+            start = time.perf_counter()
+            cur = db.execute(sql, params)
+            with closing(cur):
+                cur.fetchall()
+            elapsed = time.perf_counter() - start
+            if db.in_transaction:
+                db.rollback()
+            best = elapsed if best is None else min(best, elapsed)
+        return best or 0
+
+    def benchmark(
+        self, advices: list[Advice], sample: int = 100000, repeat: int = 3
+    ) -> list[Advice]:
+        "在抽样的数据库中比较建立索引前后的执行时间"
+        db = self.sample(sample)
+        try:
+            for advice in advices:
+                advice.before = sum(
+                    self.timeit(db, sql, repeat) for sql in advice.queries
+                )
+                db.execute(advice.sql)
+                advice.after = sum(
+                    self.timeit(db, sql, repeat) for sql in advice.queries
+                )
+                db.execute(f"drop index {advice.name}")
+        finally:
+            db.close()
+        return advices
+
+    def report(self, advices: list[Advice]):
+        "打印分析结果"
+        if not advices:
+            print("未发现可通过索引优化的全表扫描")
+            return
+        for advice in advices:
+            print(f"{advice.sql};")
+            if advice.before is not None:
+                print(
+                    f"    执行时间：{advice.before:.4f} 秒 -> {advice.after:.4f} 秒"
+                )
+            if (table := self.tables.get(advice.table)) and len(advice.columns) == 1:
+                print(f"    建议：{table.__name__}.{advice.columns[0]} 设置 has_index=True")
+            for sql in advice.queries:
+                print(f"    {sql}")
+
+
+@command(description="分析 sql 语句的执行计划，建议需要建立的索引")
+@arg("db", help="数据库")
+@arg("files", nargs="+", metavar="file", help="sql 语句文件，语句之间以 ; 分隔")
+@arg("-s", "--sample", type=int, default=100000, help="抽样行数，为 0 时不比较执行时间")
+def main(db: str, files: list[str], sample: int):
+    advisor = IndexAdvisor(connect(db))
+    for file in files:
+        advisor.add_file(file)
+    advices = advisor.analyze()
+    if sample:
+        advisor.benchmark(advices, sample)
+    advisor.report(advices)
@@ -19,12 +19,19 @@
 # 修订：2021-09-14 21:30 将 mtime、ctime 修改为输出字符串
 # 修订：2022-05-08 19:41 修改 pack 函数，支持对目录下的文件进行压缩
 # 修订：2022-09-04 13:55 write_xlsx 不在支持  force 参数
-
+# 修订：2026-10-17 17:41 read_data 新增 mmap 参数，使用内存映射读取文件
+# 修订：2026-10-17 17:42 新增 iter_batches，多进程并行读取大文件
+# 修订：2026-10-17 17:44 新增 read_fixed，使用 numpy 按列解析定长记录文件
+# 修订：2026-10-17 17:45 新增 iter_lines，根据样本检测编码，流式读取 csv 文件
+# 修订：2026-10-17 17:46 decode 改为抽样检测编码，Path.encoding 按文件缓存检测结果
+# 修订：2026-10-17 17:47 sheets、iter_sheets 按需加载工作表
+
+import io
 import os
 import pathlib
 import re
 import sys
-from codecs import BOM_BE, BOM_LE, BOM_UTF8
+from codecs import BOM_BE, BOM_LE, BOM_UTF8, getincrementaldecoder
 from contextlib import contextmanager, suppress
 from tempfile import NamedTemporaryFile, TemporaryDirectory
 from typing import Optional
@@ -75,6 +82,10 @@ BOM_CODE = {
 
 DEFAULT_CODES = "utf8", "gbk", "utf16", "big5"
 
+SAMPLE_SIZE = 1 << 16  # 检测编码时的样本大小
+ENCODING_CACHE_SIZE = 256  # 文件编码缓存的数量
+_encodings: dict[tuple, str] = {}  # 文件编码缓存，键为 (路径, 大小, 修改时间)
+
 
 def is_installed(file_name: str) -> bool:
     """
@@ -103,24 +114,189 @@ def is_dev(cmd: Optional[str] = None) -> bool:
     return "test" in cmd or (not is_installed(cmd))
 
 
-def decode(d: bytes) -> str:
+def sniff_encoding(head: bytes, *samples: bytes) -> Optional[str]:
+    """
+    根据文件开头的样本 head 及文件中间、结尾的样本 samples 推测编码，
+    无法推测时返回 None。samples 的首尾可能截断多字节字符，
+    解码时允许跳过开头的不完整字符
+    """
+
+    def check(encoding: str, sample: bytes, skip: int) -> bool:
+        for i in range(skip + 1):
+            with suppress(UnicodeDecodeError):
+                getincrementaldecoder(encoding)().decode(sample[i:], final=False)
+                return True
+        return False
+
+    for bom, encoding in BOM_CODE.items():
+        if head.startswith(bom):
+            return encoding
+    # 无 BOM 的 utf16 文本，ASCII 字符的高位字节为 0，仅出现在奇数或偶数位置。
+    # utf16 几乎可以解码任意数据，故还需确认不是 utf8（如以 NUL 填充的 utf8 文本）
+    even, odd = head[::2].count(0), head[1::2].count(0)
+    half = len(head) // 2
+    if (even == 0 or odd == 0) and max(even, odd) > half * 0.4:
+        if not check("utf8", head, 0):
+            return "utf_16_le" if odd else "utf_16_be"
+    if head.isascii() and all(x.isascii() for x in samples):
+        return DEFAULT_CODES[0]
+
+    for encoding in DEFAULT_CODES:
+        if check(encoding, head, 0) and all(check(encoding, x, 3) for x in samples):
+            return encoding
+
+
+def decode(d: bytes, encoding: Optional[str] = None) -> str:
     """
     对指定的二进制，进行智能解码，适配适当的编码。按行返回字符串。
+    先抽取开头、中间及结尾的样本推测编码，推测的编码解码失败时再逐一尝试
     """
+    return _decode(d, encoding)[0]
+
+
+def _decode(d: bytes, encoding: Optional[str] = None) -> tuple[str, str]:
+    "解码并返回实际使用的编码"
+    if not encoding:
+        size = SAMPLE_SIZE
+        samples = [d[len(d) // 2 : len(d) // 2 + size], d[-size:]]
+        encoding = sniff_encoding(d[:size], *(samples if len(d) > size else ()))
+    if encoding:
+        with suppress(UnicodeDecodeError):
+            return _decode_bom(d, encoding), encoding
     for k in BOM_CODE:
         if k == d[: len(k)]:
-            return d[len(k) :].decode(BOM_CODE[k])
+            return d[len(k) :].decode(BOM_CODE[k]), BOM_CODE[k]
     for encoding in DEFAULT_CODES:
         with suppress(UnicodeDecodeError):
-            return d.decode(encoding)
+            return d.decode(encoding), encoding
     raise Exception("解码失败！")
 
 
+def _decode_bom(d: bytes, encoding: str) -> str:
+    "解码，如有 BOM 则去除"
+    for bom, codec in BOM_CODE.items():
+        if codec == encoding and d.startswith(bom):
+            return d[len(bom) :].decode(encoding)
+    return d.decode(encoding)
+
+
+def iter_decode(f, encoding=None, errors=None, chunksize=SAMPLE_SIZE):
+    """
+    从二进制文件中逐块读取并解码，返回字符串，如有 BOM 则去除。未指定编码时，
+    使用 sniff_encoding 根据样本检测编码；样本全部为 ASCII 字符时无法判断编码，
+    直接输出并继续读取，直至出现非 ASCII 字符
+    """
+    data = f.read(chunksize)
+    if not encoding:
+        if not any(data.startswith(bom) for bom in BOM_CODE):
+            while data.isascii():
+                if data:
+                    yield data.decode("ascii")
+                if not (data := f.read(chunksize)):
+                    return
+        if not (encoding := sniff_encoding(data)):
+            raise Exception("解码失败！")
+    for bom, codec in BOM_CODE.items():
+        if codec == encoding and data.startswith(bom):
+            data = data[len(bom) :]
+    decoder = getincrementaldecoder(encoding)(errors or "strict")
+    while data:
+        if text := decoder.decode(data):
+            yield text
+        data = f.read(chunksize)
+    if text := decoder.decode(b"", final=True):
+        yield text
+
+
+def iter_lines(chunks):
+    """
+    将逐块解码的字符串按行拆分，保留换行符。与读取文本文件相同，仅以 \n、\r、\r\n
+    换行，不拆分 \x1c、\u2028 等字符。每块的最后一行可能不完整
+    （或为 \r\n 中的 \r），留待与下一块合并
+    """
+    rest = ""
+    for text in chunks:
+        lines = io.StringIO(rest + text, newline="").readlines()
+        rest = lines.pop() if lines and not lines[-1].endswith("\n") else ""
+        yield from lines
+    if rest:
+        yield rest
+
+
 def unquote(s: str, quote: str = '"') -> str:
     "删除字符串的引号"
     return s[1:-1] if s.startswith(quote) and s.endswith(quote) else s
 
 
+def iter_mmap_lines(
+    path, skip_header: bool = False, start: int = 0, end: Optional[int] = None
+):
+    """
+    使用内存映射读取文件，按行返回 memoryview，不含换行符。
+    行数据直接引用映射的内存，不做复制，仅在迭代期间有效。
+    start、end 为读取的字节区间，应与行边界对齐
+    """
+    import mmap
+
+    with open(path, "rb") as f:
+        size = os.fstat(f.fileno()).st_size
+        if not size:
+            return
+        if end is not None:
+            size = min(size, end)
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as m:
+            view = line = memoryview(m)
+            try:
+                find, pos = m.find, start
+                while pos < size:
+                    eol = find(b"\n", pos, size)
+                    if eol < 0:
+                        eol = size
+                    stop = eol - 1 if eol > pos and m[eol - 1] == 13 else eol
+                    if skip_header:
+                        skip_header = False
+                    else:
+                        line = view[pos:stop]
+                        yield line
+                        line.release()  # 释放引用，否则无法关闭映射
+                    pos = eol + 1
+            finally:
+                line.release()
+                view.release()
+
+
+def line_ranges(
+    path, chunksize: int = 1 << 25, skip_header: bool = False
+) -> list[tuple[int, int]]:
+    "将文件拆分成约 chunksize 字节的区间，区间边界与行边界对齐"
+    ranges = []
+    with open(path, "rb") as f:
+        size = os.fstat(f.fileno()).st_size
+        if skip_header:
+            f.readline()
+        start = f.tell()
+        while start < size:
+            end = start + chunksize
+            if end < size:
+                f.seek(end)
+                f.readline()  # 移至下一行的开头
+                end = f.tell()
+            else:
+                end = size
+            ranges.append((start, end))
+            start = end
+    return ranges
+
+
+def _read_range(path: str, start: int, end: int, kw: dict) -> list:
+    "在子进程中读取文件的指定区间"
+    quote = kw.pop("quote", None)
+    data = Path(path)._read_mmap(start=start, end=end, **kw)
+    if quote:
+        return [[unquote(x, quote) for x in row] for row in data]
+    return list(data)
+
+
 _Parent = pathlib.WindowsPath if os.name == "nt" else pathlib.PosixPath
 
 
@@ -185,10 +361,44 @@ class Path(_Parent):
         if not self.exists():
             self.mkdir(parents=parents)
 
+    @property
+    def _encoding_key(self) -> tuple:
+        stat = self.stat()
+        return str(self.absolute()), stat.st_size, stat.st_mtime_ns
+
+    @property
+    def encoding(self) -> Optional[str]:
+        """
+        推测文本文件的编码，抽取文件开头、中间及结尾的样本进行检测，
+        结果按文件的路径、大小及修改时间缓存
+        """
+        key = self._encoding_key
+        if (encoding := _encodings.get(key)) is None:
+            size = SAMPLE_SIZE
+            with self.open("rb") as f:
+                head, samples = f.read(size), []
+                if key[1] > size:
+                    for pos in (key[1] // 2, max(key[1] - size, size)):
+                        f.seek(pos)
+                        samples.append(f.read(size))
+            if encoding := sniff_encoding(head, *samples):
+                self._cache_encoding(key, encoding)
+        return encoding
+
+    @staticmethod
+    def _cache_encoding(key: tuple, encoding: str):
+        if len(_encodings) >= ENCODING_CACHE_SIZE:
+            _encodings.pop(next(iter(_encodings)))
+        _encodings[key] = encoding
+
     @property
     def text(self):
-        """读取文件，并返回字符串"""
-        return decode(self.read("rb"))
+        """读取文件，并返回字符串，文件的编码按路径、大小及修改时间缓存"""
+        key = self._encoding_key
+        text, encoding = _decode(self.read("rb"), self.encoding)
+        if _encodings.get(key) != encoding:  # 抽样推测的编码有误，缓存实际的编码
+            self._cache_encoding(key, encoding)
+        return text
 
     @text.setter
     def text(self, text: str):
@@ -205,6 +415,15 @@ class Path(_Parent):
         """按行写入文件"""
         self.write(lines)
 
+    def iter_lines(self, encoding=None, errors=None, chunksize=SAMPLE_SIZE):
+        """
+        按行流式读取文件，保留换行符，不会将整个文件读入内存。
+        未指定编码时使用 encoding 属性，即抽样检测并按文件缓存的编码
+        """
+        encoding = encoding or self.encoding
+        with self.open("rb") as f:
+            yield from iter_lines(iter_decode(f, encoding, errors, chunksize))
+
     def write(
         self,
         content=None,
@@ -237,11 +456,12 @@ class Path(_Parent):
         也可以为表的名称。"""
         import xlrd3 as xlrd
 
-        book = xlrd.open_workbook(filename=str(self))
-        if isinstance(index, int):
-            sheet = book.sheet_by_index(index)
-        elif isinstance(index, str):
-            sheet = book.sheet_by_name(index)
+        sheet = None
+        with xlrd.open_workbook(filename=str(self), on_demand=True) as book:
+            if isinstance(index, int):
+                sheet = book.sheet_by_index(index)
+            elif isinstance(index, str):
+                sheet = book.sheet_by_name(index)
         if sheet:
             data = sheet._cell_values
             if pipelines or header:
@@ -250,12 +470,14 @@ class Path(_Parent):
 
     def iter_sheets(self):
         """如果指定的文件为excel文件，则可以迭代读取本文件的数据。
-        返回：表的索引、表名、数据"""
+        返回：表的索引、表名、数据。工作表逐个加载，读取后即释放"""
         import xlrd3 as xlrd
 
-        book = xlrd.open_workbook(filename=str(self))
-        for index, sheet in enumerate(book.sheets()):
-            yield index, sheet.name, sheet._cell_values
+        with xlrd.open_workbook(filename=str(self), on_demand=True) as book:
+            for index in range(book.nsheets):
+                sheet = book.sheet_by_index(index)
+                yield index, sheet.name, sheet._cell_values
+                book.unload_sheet(index)
 
     def iter_csv(
         self,
@@ -281,14 +503,8 @@ class Path(_Parent):
         """
         import csv
 
-        def reader():
-            with self.open(encoding=encoding, errors=errors) as f:
-                yield from f
-
         filter = filter or _filter
-        data = csv.reader(
-            reader() if encoding else self.lines, dialect=dialect, **kw
-        )
+        data = csv.reader(self.iter_lines(encoding, errors), dialect=dialect, **kw)
         if any([columns, pipelines, filter, rows, converter]):
             data = Data(
                 data,
@@ -578,6 +794,9 @@ class Path(_Parent):
         columns=None,  # 仅包含哪列
         include=None,  # 仅包含哪些列
         quote=None,  # 引用符号
+        mmap=False,  # 使用内存映射读取文件，仅解码选取的列
+        workers=0,  # 并行读取的进程数，参见 iter_batches
+        fixed=False,  # 定长记录文件按列解析，需安装 numpy，参见 read_fixed
         **kwargs,
     ):  # 其他 Data 支持的关键词参数
         """对金融科技部提供数据索取文件进行解析
@@ -586,6 +805,36 @@ class Path(_Parent):
         """
         from orange.utils.data import includer, mapper
 
+        if fixed and offsets:
+            data = self.read_fixed(
+                offsets, encoding, errors, skip_header, columns or include
+            )
+            if quote:
+                data = map(lambda row: [unquote(x, quote) for x in row], data)
+            return Data(data, *args, **kwargs)
+
+        if workers:
+            from itertools import chain
+
+            batches = self.iter_batches(
+                encoding=encoding,
+                errors=errors,
+                skip_header=skip_header,
+                offsets=offsets,
+                sep=sep,
+                columns=columns or include,
+                quote=quote,
+                workers=workers,
+            )
+            return Data(chain.from_iterable(batches), *args, **kwargs)
+        if mmap:
+            data = self._read_mmap(
+                encoding, errors, skip_header, offsets, sep, columns or include
+            )
+            if quote:
+                data = map(lambda row: [unquote(x, quote) for x in row], data)
+            return Data(data, *args, **kwargs)
+
         def _read(path: Path):  # , encoding, errors, sep, skip_header):
             with path.open("rb") as f:
                 yield from f
@@ -625,6 +874,140 @@ class Path(_Parent):
             )
         return Data(data, *pipelines, *args, **kwargs)
 
+    def iter_batches(
+        self,
+        encoding="GBK",
+        errors="strict",
+        skip_header=True,
+        offsets=None,
+        sep=b"|",
+        columns=None,
+        quote=None,
+        workers=None,
+        chunksize=1 << 25,
+        ordered=True,
+    ):
+        """
+        多进程并行读取数据文件，文件按行边界拆分成约 chunksize 字节的区间，
+        每个区间由一个进程解析，按区间返回批量数据：[][]str，
+        可直接用于 Connection.load 或 Data。参数同 read_data，另有：
+        workers:    进程数，默认为 CPU 核数
+        ordered:    是否按文件顺序返回，否则按解析完成的顺序返回
+        """
+        from orange.utils.htutil import pool_starmap
+
+        kw = dict(
+            encoding=encoding,
+            errors=errors,
+            skip_header=False,
+            offsets=offsets,
+            sep=sep,
+            columns=columns,
+            quote=quote,
+        )
+        tasks = (
+            (str(self), start, end, dict(kw))
+            for start, end in line_ranges(self, chunksize, skip_header)
+        )
+        for _, rows in pool_starmap(_read_range, tasks, workers, ordered):
+            yield rows
+
+    def read_fixed(
+        self,
+        offsets,
+        encoding="GBK",
+        errors="strict",
+        skip_header=True,
+        columns=None,
+        blocksize=1 << 20,
+    ):
+        """
+        按列解析定长记录文件，每行的字节数必须相同。文件映射为 numpy 结构数组，
+        每个字段为一列，每次取 blocksize 行，按列整体解码后再组合成行返回。
+        每行末尾的换行符也作为一个字段，逐块检查，行长度不一致时报错
+        offsets:    各字段的起始位置，格式为 (0,11,21...)
+        columns:    仅包含哪些列
+        """
+        import numpy as np
+
+        with self.open("rb") as f:
+            header = len(f.readline()) if skip_header else 0
+            first = f.readline()
+        if not first:
+            return
+        reclen = len(first)
+        datalen = len(first.rstrip(b"\r\n"))
+        eol = first[datalen:]
+        count, rest = divmod(self.size - header, reclen)
+        if rest and rest != datalen:  # 仅允许最后一行没有换行符
+            raise Exception(f"{self.name} 不是定长记录文件")
+        spans = list(zip(offsets, [*offsets[1:], datalen]))
+        if columns:
+            spans = [spans[col] for col in columns]
+        names = [f"f{i}" for i in range(len(spans))]
+        if eol:  # 换行符作为一个字段，用于检查行长度
+            spans.append((datalen, reclen))
+        dtype = np.dtype(
+            {
+                "names": [*names, "eol"] if eol else names,
+                "formats": [f"S{end - start}" for start, end in spans],
+                "offsets": [start for start, _ in spans],
+                "itemsize": reclen,
+            }
+        )
+        blocks = []
+        if count:
+            records = np.memmap(
+                str(self), dtype, mode="r", offset=header, shape=(count,)
+            )
+            blocks = [records[i : i + blocksize] for i in range(0, count, blocksize)]
+        if rest:  # 最后一行没有换行符，补上换行符后单独处理
+            with self.open("rb") as f:
+                f.seek(header + count * reclen)
+                blocks.append(np.frombuffer(f.read() + eol, dtype))
+
+        def decode(column) -> list[str]:
+            # 合并后整体解码，再拆分；字段中含有换行符时逐个解码
+            values = column.tolist()
+            text = b"\n".join(values).decode(encoding, errors)
+            if len(result := text.split("\n")) != len(values):
+                result = [x.decode(encoding, errors) for x in values]
+            return [x.strip() for x in result]
+
+        start = 2 if skip_header else 1  # 当前块第一行的行号
+        for block in blocks:
+            if eol and not (ok := block["eol"] == eol).all():
+                line = start + int(np.flatnonzero(~ok)[0])
+                raise Exception(f"{self.name} 不是定长记录文件，第 {line} 行长度不一致")
+            start += len(block)
+            yield from map(list, zip(*(decode(block[name]) for name in names)))
+
+    def _read_mmap(
+        self, encoding, errors, skip_header, offsets, sep, columns, start=0, end=None
+    ):
+        "使用内存映射读取数据，按位置拆分时直接对 memoryview 切片，仅解码选取的列"
+        from codecs import getdecoder
+
+        decode = getdecoder(encoding)  # 预先获取解码器，避免每次按名称查找编码
+        lines = iter_mmap_lines(self, skip_header, start, end)
+        if offsets:
+            spans = list(zip(offsets, [*offsets[1:], None]))
+            if columns:
+                spans = [spans[col] for col in columns]
+            for line in lines:
+                yield [
+                    decode(line[start:end], errors)[0].strip()
+                    for start, end in spans
+                ]
+        else:
+            if isinstance(sep, str):
+                sep = sep.encode(encoding)
+            for line in lines:
+                row = line.tobytes().split(sep)
+                if columns:
+                    row = [row[col] for col in columns]
+                yield [decode(x, errors)[0].strip() for x in row]
+
     def rar(self, dest: str, passwd=None):
         "将本文件或文件打包成一个 Rar 文件"
         "如果当前路径为目录，并且目标路径也为目录的话，把当前文件夹打包后的压缩文件存在放在指定目录下"
@@ -10,15 +10,50 @@
 # 修订：2022-07-07 10:05 db.fprint 函数，增加 sep 和 end 参数
 # 修订：2022-09-04 13:56 新增 export 函数，支持将查询结果导入 excel 文件
 # 修订：2025-09-06 15:06 强制类型优化，采用类的方式调用
-
+# 修订：2026-10-17 17:31 load 函数支持分批导入及批量导入模式
+# 修订：2026-10-17 17:31 update 函数改为通过临时表批量更新
+# 修订：2026-10-17 17:32 新增 iterfetch 函数，分批读取查询结果
+# 修订：2026-10-17 17:34 export 函数改为流式写入 Excel 文件
+# 修订：2026-10-17 17:34 新增 sql 语句缓存
+# 修订：2026-10-17 17:35 新增 Pool 类，提供线程安全的连接池
+# 修订：2026-10-17 17:36 新增 LoadFile 类，管理文件导入登记表
+# 修订：2026-10-17 17:37 新增 Profiler 类，记录慢查询
+# 修订：2026-10-17 17:38 load 函数新增 upsert 导入方式
+# 修订：2026-10-17 17:55 load 分批导入 Data 时使用其批量处理模式
+# 修订：2026-10-17 18:13 update 的数据中键值重复时，以最后一行为准
+
+import datetime as dt
+import re
 import sqlite3
-from contextlib import closing
+import threading
+import time
+from collections import OrderedDict, namedtuple
+from contextlib import closing, contextmanager, suppress
+from dataclasses import dataclass
 from functools import wraps
-from typing import Callable, Iterable, Optional, Union
+from itertools import chain
+from queue import Empty, LifoQueue
+from typing import Any, Callable, Hashable, Iterable, Optional, Union
 
 from orange.shell import Path
 from orange.utils.datetime_ import datetime
-from orange.utils.htutil import tprint, wlen
+from orange.utils.htutil import split, tprint, wlen
+from orange.utils.log import logger
+
+# 批量导入时使用的数据库参数，cache_size 为负数时单位为 KB
+BULK_PRAGMAS = {
+    "journal_mode": "memory",
+    "synchronous": "off",
+    "cache_size": -200000,
+}
+
+# 以下参数不能在事务中修改
+_TRAN_PRAGMAS = ("journal_mode", "synchronous")
+
+CACHED_STATEMENTS = 256  # sqlite3 预编译语句缓存的数量
+SQL_CACHE_SIZE = 256  # 生成的 sql 语句缓存的数量
+
+CacheInfo = namedtuple("CacheInfo", "hits misses maxsize currsize")
 
 
 def Values(count):
@@ -26,6 +61,24 @@ def Values(count):
     return f"VALUES({','.join('?' * count)})"
 
 
+# 文件导入登记表，主键 (name,path) 同时作为按 name 及 name、path 查询的索引
+_LOADFILE_SQL = (
+    "create table if not exists loadfile("
+    "name	text,"
+    "path	text,"
+    "mtime	text,"
+    "ver		text,"
+    "primary key(name,path)"
+    ")"
+)
+_QUERY_SQL = "select mtime from loadfile where name=? and path=?"
+_QUERY_ALL_SQL = "select path,mtime from loadfile where name=?"
+_DONE_SQL = "insert or replace into loadfile values(?,?,?,?)"
+
+MTIME_FMT = "%Y-%m-%d %H:%M:%S"
+_MTIME_PATTERN = re.compile(r"\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2}")
+
+
 def fix_db_name(database: Union[str, Path]) -> str:
     """修复数据库文件名"""
     ROOT = Path("~/.data")
@@ -39,6 +92,43 @@ def fix_db_name(database: Union[str, Path]) -> str:
     return file
 
 
+def format_mtime(mtime: Union[datetime, dt.datetime, str, Iterable, None]) -> str:
+    "将文件修改时间转换成 YYYY-MM-DD HH:MM:SS 格式的字符串，为空时取当前时间"
+    if isinstance(mtime, str) and _MTIME_PATTERN.fullmatch(mtime):
+        return mtime  # Path.mtime 返回的格式，无需转换
+    if mtime is None:
+        return dt.datetime.now().strftime(MTIME_FMT)
+    if isinstance(mtime, dt.datetime):
+        return mtime.strftime(MTIME_FMT)
+    if isinstance(mtime, (tuple, list)):
+        return datetime(*mtime) % MTIME_FMT
+    return datetime(mtime) % MTIME_FMT
+
+
+def upsert_sql(
+    table: str, fields: Iterable[str], keys: Iterable[str], changed_only: bool = False
+) -> str:
+    """
+    生成 upsert 语句，主键冲突时仅更新非主键字段，
+    changed_only 为真时，内容未变化的行不做更新
+    """
+    if not (isinstance(fields, (tuple, list)) and keys):
+        raise Exception("upsert 需指定字段名及主键")
+    values = [x for x in fields if x not in keys]
+    sql = (
+        f"insert into {table}({','.join(fields)}) {Values(len(fields))} "
+        f"on conflict({','.join(keys)}) do "
+    )
+    if not values:
+        return sql + "nothing"
+    sql += "update set " + ",".join(f"{x}=excluded.{x}" for x in values)
+    if changed_only:
+        old = ",".join(f"{table}.{x}" for x in values)
+        new = ",".join(f"excluded.{x}" for x in values)
+        sql += f" where ({old}) is not ({new})"
+    return sql
+
+
 class LoadError(Exception):
     def __init__(self, path: Union[str, Path]):
         self.path =path
@@ -47,10 +137,240 @@ class LoadError(Exception):
         return f"{self.path} 已导入"
 
 
+@dataclass
+class LoadResult:
+    "导入结果，rowcount 为导入的总行数，分批导入时为各批之和"
+
+    rowcount: int = 0  # 导入的行数
+    elapsed: float = 0  # 耗时，单位：秒
+
+
+@dataclass
+class QueryStat:
+    kind: str  # 类型：fetch、load、update
+    sql: str  # sql 语句
+    count: int = 0  # 执行次数
+    total: float = 0  # 总耗时，单位：秒
+    max: float = 0  # 最长耗时，单位：秒
+    rows: int = 0  # 返回或影响的行数
+    slow: int = 0  # 超过阈值的次数
+    plan: Optional[list[str]] = None  # 执行计划
+
+    @property
+    def full_scan(self) -> bool:
+        "执行计划中是否包含全表扫描"
+        return any(
+            detail.startswith("SCAN ") and " USING " not in detail
+            for detail in self.plan or ()
+        )
+
+
+class Profiler:
+    """
+    查询性能分析器，记录每条语句的执行次数、耗时及返回或影响的行数；
+    耗时超过阈值的语句，记录其执行计划并写入日志，可用于发现缺失的索引。使用方法：
+    db.profiler = Profiler(db, threshold=0.5)
+    ...
+    db.profiler.print()
+    """
+
+    def __init__(self, db: "Connection", threshold: float = 1.0, explain: bool = True):
+        """
+        threshold:  慢查询的阈值，单位：秒
+        explain:    是否记录慢查询的执行计划
+        """
+        self.db = db
+        self.threshold = threshold
+        self.explain = explain
+        self.stats: dict[tuple[str, str], QueryStat] = {}
+
+    def record(self, kind: str, sql: str, params, elapsed: float, rows: int):
+        "记录语句的执行情况"
+        key = kind, sql
+        if not (stat := self.stats.get(key)):
+            stat = self.stats[key] = QueryStat(kind, sql)
+        stat.count += 1
+        stat.total += elapsed
+        stat.max = max(stat.max, elapsed)
+        stat.rows += max(rows, 0)
+        if elapsed < self.threshold:
+            return
+        stat.slow += 1
+        if self.explain and stat.plan is None and kind != "load":
+            stat.plan = self.explain_plan(sql, params)
+        plan = "\n".join(stat.plan or ())
+        logger.warning(
+            f"慢查询：{kind}，耗时 {elapsed:.3f} 秒，{rows:,d} 行\n{sql}\n{plan}"
+        )
+
+    def explain_plan(self, sql: str, params=()) -> list[str]:
+        "获取语句的执行计划"
+        try:
+            cur = sqlite3.Connection.execute(
+                self.db, f"explain query plan {sql}", params
+            )
+            with closing(cur):
+                return [row[-1] for row in cur]
+        except sqlite3.Error:
+            return []
+
+    def rows(self) -> list[tuple]:
+        "按总耗时倒序返回统计数据"
+        return [
+            (s.kind, s.count, s.total, s.max, s.rows, s.slow, s.full_scan, s.sql)
+            for s in sorted(self.stats.values(), key=lambda s: s.total, reverse=True)
+        ]
+
+    def print(self, limit: int = 20):
+        "打印耗时最长的语句"
+        print("类型    次数  总耗时  最长耗时       行数  慢查询 全表扫描 语句")
+        tprint(
+            (
+                (*row[:6], "是" if row[6] else "", " ".join(row[7].split())[:60])
+                for row in self.rows()[:limit]
+            ),
+            format_spec="{:<6} {:>6,d} {:>8.3f} {:>8.3f} {:>10,d} {:>6,d} {:^8} {}",
+        )
+
+    def clear(self):
+        "清空统计数据"
+        self.stats.clear()
+
+
+class LoadFile:
+    """
+    文件导入登记表，记录已导入文件的名称、路径、修改时间及版本。
+    每个连接建表一次，并缓存已导入文件的修改时间，供批量预先排除已导入的文件；
+    未导入的文件不缓存，其他连接可能随后登记。登记后清除相应的缓存，
+    以免事务回滚后缓存与数据库不一致。lcheck 总是查询数据库
+    """
+
+    def __init__(self, db: "Connection"):
+        self.db = db
+        self._ready = False
+        self._cache: dict[tuple[str, str], str] = {}
+
+    def ensure(self):
+        """
+        确保登记表已建立。如在事务中建表，事务可能回滚，故仅在事务外建表后
+        才记录为已建立，事务中每次均执行 create table if not exists
+        """
+        if not self._ready:
+            self.db.execute(_LOADFILE_SQL).close()
+            self._ready = not self.db.in_transaction
+
+    def get_mtime(
+        self, name: str, path: Union[str, Path], cached: bool = True
+    ) -> Optional[str]:
+        "获取已导入文件的修改时间，未导入时返回 None；cached 为假时查询数据库"
+        key = name, str(path)
+        if cached and (mtime := self._cache.get(key)):
+            return mtime
+        self.ensure()
+        if mtime := self.db.fetchvalue(_QUERY_SQL, key):
+            self._cache[key] = mtime
+        else:
+            self._cache.pop(key, None)
+        return mtime
+
+    def is_loaded(
+        self,
+        name: str,
+        path: Union[str, Path],
+        mtime: Union[datetime, str, Iterable, None] = None,
+        cached: bool = True,
+    ) -> bool:
+        "检查文件是否已导入"
+        loaded = self.get_mtime(name, path, cached)
+        return bool(loaded) and loaded >= format_mtime(mtime)
+
+    def done(
+        self,
+        name: str,
+        path: Union[str, Path],
+        mtime: Union[datetime, str, Iterable, None] = None,
+        ver: Optional[str] = None,
+    ):
+        "登记已导入的文件"
+        self.ensure()
+        path = str(path)
+        self.db.execute(_DONE_SQL, [name, path, format_mtime(mtime), ver]).close()
+        self._cache.pop((name, path), None)
+
+    def check_files(self, name: str, paths: Iterable) -> list[Path]:
+        "批量检查文件，返回未导入或已更新的文件，只查询一次数据库"
+        self.ensure()
+        for path, mtime in self.db.fetch(_QUERY_ALL_SQL, [name]):
+            self._cache[name, path] = mtime
+        result = []
+        for path in map(Path, paths):
+            loaded = self._cache.get((name, str(path)))
+            if not (loaded and loaded >= path.mtime):
+                result.append(path)
+        return result
+
+    def clear(self):
+        "清空缓存"
+        self._cache.clear()
+
+
 class Connection(sqlite3.Connection):
-    def __init__(self, database: Union[str, Path], **kw):
+    def __init__(
+        self,
+        database: Union[str, Path],
+        cached_statements: int = CACHED_STATEMENTS,
+        sql_cache_size: int = SQL_CACHE_SIZE,
+        **kw,
+    ):
+        """
+        database:           数据库文件名
+        cached_statements:  sqlite3 预编译语句缓存的数量
+        sql_cache_size:     load、update 等函数生成的 sql 语句缓存的数量
+        """
         database = str(fix_db_name(database))
-        super().__init__(database, **kw)
+        super().__init__(database, cached_statements=cached_statements, **kw)
+        self._sql_cache = OrderedDict()
+        self._sql_cache_size = sql_cache_size
+        self._sql_hits = self._sql_misses = 0
+        self.loadfile = LoadFile(self)
+        self.profiler: Optional[Profiler] = None
+
+    def set_profiler(self, threshold: float = 1.0, explain: bool = True) -> Profiler:
+        "开启查询性能分析，fetch、load、update 等函数的执行情况将被记录"
+        self.profiler = Profiler(self, threshold, explain)
+        return self.profiler
+
+    def cached_sql(self, key: Hashable, builder: Callable[[], Any]) -> Any:
+        """
+        从缓存中获取生成的 sql 语句，缓存中不存在时调用 builder 生成。
+        缓存按最近使用的顺序淘汰，使生成的 sql 语句文本保持一致，
+        以便命中 sqlite3 的预编译语句缓存
+        """
+        cache = self._sql_cache
+        if key in cache:
+            self._sql_hits += 1
+            cache.move_to_end(key)
+            return cache[key]
+        self._sql_misses += 1
+        sql = cache[key] = builder()
+        if len(cache) > self._sql_cache_size:
+            cache.popitem(last=False)
+        return sql
+
+    @property
+    def sql_cache_info(self) -> CacheInfo:
+        "sql 语句缓存的命中情况"
+        return CacheInfo(
+            self._sql_hits,
+            self._sql_misses,
+            self._sql_cache_size,
+            len(self._sql_cache),
+        )
+
+    def clear_sql_cache(self):
+        "清空 sql 语句缓存"
+        self._sql_cache.clear()
+        self._sql_hits = self._sql_misses = 0
 
     def executefile(self, pkg: str, filename: str):
         """
@@ -64,21 +384,63 @@ class Connection(sqlite3.Connection):
         if data:
             return self.executescript(data.decode())
 
+    @contextmanager
+    def pragmas(self, **pragmas):
+        """
+        临时修改数据库参数，退出时恢复原值，使用方法：
+        with db.pragmas(synchronous="off", cache_size=-200000):
+            ...
+        journal_mode 和 synchronous 不能在事务中修改，此时将被忽略
+        """
+        saved = {}
+        for name, value in pragmas.items():
+            if name in _TRAN_PRAGMAS and self.in_transaction:
+                continue
+            saved[name] = self.fetchvalue(f"pragma {name}")
+            self.execute(f"pragma {name}={value}").close()
+        try:
+            yield self
+        finally:
+            for name, value in saved.items():
+                if name in _TRAN_PRAGMAS and self.in_transaction:
+                    continue
+                self.execute(f"pragma {name}={value}").close()
+
     def fetch(self, sql: str, params: list = [], multi=True):
         "执行一条 sql 语句，并取出所以查询结果"
+        start = time.perf_counter()
         cur = self.execute(sql, params)
         with closing(cur):
-            return cur.fetchall() if multi else cur.fetchone()
+            result = cur.fetchall() if multi else cur.fetchone()
+        if self.profiler:
+            rows = len(result) if multi else int(result is not None)
+            elapsed = time.perf_counter() - start
+            self.profiler.record("fetch", sql, params, elapsed, rows)
+        return result
+
+    def iterfetch(self, sql: str, params: list = [], arraysize: int = 1000):
+        "执行一条 sql 语句，按 arraysize 分批读取并逐行返回查询结果"
+        start, count = time.perf_counter(), 0
+        cur = self.execute(sql, params)
+        cur.arraysize = arraysize
+        with closing(cur):
+            while rows := cur.fetchmany():
+                count += len(rows)
+                yield from rows
+        if self.profiler:
+            elapsed = time.perf_counter() - start
+            self.profiler.record("fetch", sql, params, elapsed, count)
 
     def export(
         self, path: Union[str, Path], querysql: str, params: list = [], **kwargs
     ):
-        """将查询结果导入到 Excel 文件中"""
+        """将查询结果导入到 Excel 文件中，数据逐行写入，超出最大行数时自动拆分工作表"""
         from orange.xlsx import write_excel
 
-        if data := self.fetch(querysql, params):
-            with write_excel(path) as book:
-                book.add_table(data=data, **kwargs)
+        data = self.iterfetch(querysql, params)
+        if first := next(data, None):
+            with write_excel(path, options={"constant_memory": True}) as book:
+                book.write_table(data=chain([first], data), **kwargs)
 
     def fetchone(self, sql: str, params: list = []):
         "执行一条 sql 语句， 并取出第一条记录"
@@ -100,7 +462,7 @@ class Connection(sqlite3.Connection):
 
     def fprint(self, sql: str, params: list = [], sep=" ", end="\n"):
         "打印查询结果"
-        for row in self.fetch(sql, params):
+        for row in self.iterfetch(sql, params):
             print(*row, sep=sep, end=end)
 
     print = fprint
@@ -111,7 +473,10 @@ class Connection(sqlite3.Connection):
 
     def count(self, sql: str, params: list = []):
         "统计指定 sql 语句的行数"
-        return self.fetchvalue(f"select count(*)from ({sql})")
+        countsql = self.cached_sql(
+            ("count", sql), lambda: f"select count(*)from ({sql})"
+        )
+        return self.fetchvalue(countsql, params)
 
     def print_count(self, sql: str, params: list = []):
         "打印指定 sql 语句的数量"
@@ -142,7 +507,7 @@ class Connection(sqlite3.Connection):
             print("数据版本", ver, sep="：")
 
     def fprintf(self, fmt: str, sql: str, params: list = [], print_rows: bool = True):
-        tprint(self.fetch(sql, params), format_spec=fmt, print_rows=print_rows)
+        tprint(self.iterfetch(sql, params), format_spec=fmt, print_rows=print_rows)
 
     printf = fprintf
 
@@ -156,29 +521,11 @@ class Connection(sqlite3.Connection):
         """
         检查文件是否重复导入，一般应与load函数或 Loader.load 放在同一个事务内执行
         """
-        fmt = "%F %H:%M:%S"
-        if isinstance(mtime, (tuple, list)):
-            mtime = datetime(*mtime) % fmt
-        else:
-            mtime = datetime(mtime) % fmt
-        checkSQL = (
-            "select count(name) from loadfile where name=? and path=? and mtime>=?"
-        )
-        doneSQL = "insert or replace into loadfile values(?,?,?,?)"
-        try:
-            if self.fetchvalue(checkSQL, [name, str(path), mtime]):
-                raise LoadError(path)
-        except sqlite3.OperationalError:
-            self.executescript(
-                "create table if not exists loadfile("
-                "name	text,"
-                "path	text,"
-                "mtime	text,"
-                "ver		text,"
-                "primary key(name,path)"
-                ");"
-            )
-        self.execute(doneSQL, [name, str(path), mtime, ver])
+        mtime = format_mtime(mtime)
+        # 在调用者的事务中查询，不使用缓存，以免其他连接已登记该文件
+        if self.loadfile.is_loaded(name, path, mtime, cached=False):
+            raise LoadError(path)
+        self.loadfile.done(name, path, mtime, ver)
 
     def load(
         self,
@@ -188,34 +535,99 @@ class Connection(sqlite3.Connection):
         method: str = "insert",
         clear: bool = True,
         print_result: bool = False,
-    ) -> sqlite3.Cursor:
+        chunksize: int = 0,
+        bulk: Union[bool, dict] = False,
+        keys: Union[str, Iterable[str], None] = None,
+        changed_only: bool = False,
+    ) -> LoadResult:
         """
         将入数据导入数据库
         table:  表名
         fields: 导入字段列表，格式为：用逗号分割的字符串；tuple 或 list ；或者为字段数量
         data:   装入的数据
-        method: 装入方式，可以为:insert、replace or ignore
+        method: 装入方式，可以为:insert、replace、ignore or upsert
+                upsert: 主键冲突时仅更新非主键字段，需指定 fields 字段名及 keys 主键
         clear:  是否清空数据库表
+        chunksize: 每批导入的行数，0 为一次性导入；分批导入时，print_result 将打印每批的导入速度；
+                data 为 Data 时，使用其批量处理模式，按批处理后直接导入
+        bulk:   批量导入模式，导入期间使用 BULK_PRAGMAS 或指定的数据库参数；
+                如未在事务中，则整个导入作为一个事务提交
+        keys:   主键，upsert 方式使用，格式同 fields
+        changed_only: upsert 方式时，仅更新内容发生变化的行，未变化的行不写入
+        返回 LoadResult，其 rowcount 为导入的总行数
         """
+        if bulk:
+            pragmas = BULK_PRAGMAS if bulk is True else bulk
+            kw = dict(
+                method=method,
+                clear=clear,
+                print_result=print_result,
+                chunksize=chunksize or 100000,
+                keys=keys,
+                changed_only=changed_only,
+            )
+            with self.pragmas(**pragmas):
+                if self.in_transaction:
+                    return self.load(table, fields, data, **kw)
+                with self:
+                    return self.load(table, fields, data, **kw)
         if clear:
             self.execute(f"delete from {table}")
-        if method == "replace":
-            method = "insert or replace"
-        elif method == "ignore":
-            method = "insert or ignore"
-        if isinstance(fields, int):
-            sql = f"{method} into {table} {Values(fields)}"
-        elif isinstance(fields, str):
-            fieldcount = len(fields.split(","))
-            sql = f"{method} into {table}({fields}) {Values(fieldcount)}"
-        elif isinstance(fields, (tuple, list)):
-            sql = f"{method} into {table}({','.join(fields)}) {Values(len(fields))}"
+
+        if isinstance(fields, str):
+            fields = fields.split(",")
+        if isinstance(keys, str):
+            keys = keys.split(",")
+        keys = tuple(keys or ())
+
+        def build():
+            if method == "upsert":
+                return upsert_sql(table, fields, keys, changed_only)
+            _method = method
+            if _method == "replace":
+                _method = "insert or replace"
+            elif _method == "ignore":
+                _method = "insert or ignore"
+            if isinstance(fields, int):
+                return f"{_method} into {table} {Values(fields)}"
+            elif isinstance(fields, (tuple, list)):
+                return f"{_method} into {table}({','.join(fields)}) {Values(len(fields))}"
+            else:
+                raise Exception("param fields is wrong")
+
+        key = tuple(fields) if isinstance(fields, list) else fields
+        sql = self.cached_sql(("load", table, key, method, keys, changed_only), build)
+        if not chunksize:
+            start = time.perf_counter()
+            result = self.executemany(sql, data)
+            elapsed = time.perf_counter() - start
+            if self.profiler:
+                self.profiler.record("load", sql, (), elapsed, result.rowcount)
+            if print_result:
+                print(f"导入数量：{result.rowcount:,d}")
+            return LoadResult(result.rowcount, elapsed)
+        total, start = 0, time.perf_counter()
+        if hasattr(data, "batches"):
+            batches = data.batches(chunksize)
         else:
-            raise Exception("param fields is wrong")
-        result = self.executemany(sql, data)
+            batches = split(data, chunksize)
+        for idx, rows in enumerate(batches, 1):
+            begin = time.perf_counter()
+            result = self.executemany(sql, rows)
+            total += result.rowcount
+            if print_result:
+                elapsed = time.perf_counter() - begin
+                speed = result.rowcount / elapsed if elapsed else 0
+                print(
+                    f"第 {idx:,d} 批：{result.rowcount:,d} 条，"
+                    f"速度：{speed:,.0f} 条/秒"
+                )
+        elapsed = time.perf_counter() - start
+        if self.profiler:
+            self.profiler.record("load", sql, (), elapsed, total)
         if print_result:
-            print(f"导入数量：{result.rowcount:,d}")
-        return result
+            print(f"导入数量：{total:,d}，耗时：{elapsed:.2f} 秒")
+        return LoadResult(total, elapsed)
 
     def update(
         self,
@@ -232,6 +644,9 @@ class Connection(sqlite3.Connection):
         values: 数据列表，应与 data 每一行的列数一致
         data:   需要更新的数据
         print_result: 打印更新的数量
+        数据先批量写入临时表，再按键值关联更新。data 中键值重复时以最后一行为准，
+        返回数据库表中被更新的行数：不在表中的键值不计入，重复的键值只计一次，
+        表中同一键值有多行时均计入
         """
 
         def conv(fields: Union[str,Iterable[str]]) -> Iterable[str]:
@@ -241,15 +656,51 @@ class Connection(sqlite3.Connection):
                     return _fields
             return fields
 
-        keys = conv(keys)
-        values = conv(values)
-        upvalues = ",".join(f"{x}=:{x}" for x in set(values) - set(keys))
-        keys = " and ".join(f"{x}=:{x}" for x in keys)
-        sql = f"update {table} set {upvalues} where {keys}"
-        count = 0
-        for row in data:
-            r = self.execute(sql, dict(zip(values, row)))
-            count += r.rowcount
+        keys = tuple(conv(keys))
+        values = tuple(conv(values))
+
+        def build():
+            upfields = [x for x in values if x not in keys]
+            tmp = "_update_" + table.replace(".", "_")
+            dropsql = f"drop table if exists temp.{tmp}"
+            createsql = f"create temp table {tmp}({','.join(values)})"
+            indexsql = f"create index temp.{tmp}_keys on {tmp}({','.join(keys)})"
+            insertsql = f"insert into temp.{tmp} {Values(len(values))}"
+            # 键值重复时仅保留最后一行，否则 update 任取其中一行
+            dedupsql = (
+                f"delete from temp.{tmp} where rowid not in "
+                f"(select max(rowid) from temp.{tmp} group by {','.join(keys)})"
+            )
+            cond = " and ".join(f"{table}.{x}=_new.{x}" for x in keys)
+            if sqlite3.sqlite_version_info >= (3, 33, 0):
+                upvalues = ",".join(f"{x}=_new.{x}" for x in upfields)
+                sql = f"update {table} set {upvalues} from temp.{tmp} _new where {cond}"
+            else:  # 老版本的 sqlite 不支持 update ... from 语法
+                fields = ",".join(upfields)
+                newfields = ",".join(f"_new.{x}" for x in upfields)
+                select = f"select {newfields} from temp.{tmp} _new where {cond}"
+                sql = (
+                    f"update {table} set ({fields})=({select}) "
+                    f"where exists (select 1 from temp.{tmp} _new where {cond})"
+                )
+            return dropsql, createsql, indexsql, insertsql, dedupsql, sql
+
+        dropsql, createsql, indexsql, insertsql, dedupsql, sql = self.cached_sql(
+            ("update", table, keys, values), build
+        )
+        start = time.perf_counter()
+        self.execute(dropsql)
+        self.execute(createsql)
+        self.execute(indexsql)
+        try:
+            self.executemany(insertsql, data)
+            self.execute(dedupsql)
+            count = self.execute(sql).rowcount
+            if self.profiler:
+                elapsed = time.perf_counter() - start
+                self.profiler.record("update", sql, (), elapsed, count)
+        finally:
+            self.execute(dropsql)
         if print_result:
             print(f"更新数据：{count:,d} 条")
         return count
@@ -272,3 +723,94 @@ class Connection(sqlite3.Connection):
 
 def connect(db: Union[str, Path], **kw) -> Connection:
     return Connection(db, **kw)
+
+
+class Pool:
+    """
+    线程安全的数据库连接池，使用 WAL 模式：
+    读连接可以由多个线程同时使用，最多 size 个；写连接只有一个，各线程串行使用
+    pool = Pool("test")
+    with pool.reader() as db:
+        db.fetch(sql)
+    with pool.writer() as db:   # 整个代码块为一个事务
+        db.load(table, fields, data)
+    """
+
+    def __init__(
+        self, database: Union[str, Path], size: int = 8, timeout: float = 30, **kw
+    ):
+        """
+        database: 数据库文件名
+        size:     读连接的最大数量
+        timeout:  等待连接及数据库锁的时间，单位为秒
+        kw:       其他 Connection 所需参数
+        """
+        self.database = fix_db_name(database)
+        if self.database.startswith(":"):
+            raise Exception("内存数据库不支持连接池")
+        self.size = size
+        self.timeout = timeout
+        self._kw = kw
+        self._readers = LifoQueue(maxsize=size)
+        self._created = 0
+        self._lock = threading.Lock()  # 保护读连接的创建
+        self._write_lock = threading.Lock()  # 写连接串行使用
+        self._writer = self._connect()
+        self._writer.execute("pragma journal_mode=wal").close()
+
+    def _connect(self) -> Connection:
+        return Connection(
+            self.database, timeout=self.timeout, check_same_thread=False, **self._kw
+        )
+
+    def _get_reader(self) -> Connection:
+        with suppress(Empty):
+            return self._readers.get_nowait()
+        with self._lock:
+            if self._created < self.size:
+                self._created += 1
+                db = self._connect()
+                db.execute("pragma query_only=1").close()
+                return db
+        try:
+            return self._readers.get(timeout=self.timeout)
+        except Empty:
+            raise Exception("获取数据库连接超时") from None
+
+    @contextmanager
+    def reader(self):
+        "借用一个只读连接，用完后归还连接池"
+        db = self._get_reader()
+        try:
+            yield db
+        finally:
+            if db.in_transaction:
+                db.rollback()
+            self._readers.put(db)
+
+    @contextmanager
+    def writer(self):
+        "借用写连接，代码块作为一个事务执行，正常结束时提交，出现异常时回滚"
+        if not self._write_lock.acquire(timeout=self.timeout):
+            raise Exception("获取数据库连接超时")
+        try:
+            with self._writer:
+                yield self._writer
+        finally:
+            self._write_lock.release()
+
+    def close(self):
+        "关闭所有连接"
+        while True:
+            try:
+                self._readers.get_nowait().close()
+            except Empty:
+                break
+        with self._write_lock:
+            self._writer.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
@@ -4,15 +4,28 @@
 # License: GPL
 # Email:   huangtao.sh@icloud.com
 # 创建：2025-01-23 15:54
+# 修订：2026-10-17 17:35 新增 load_files，多进程读取多个文件后导入
+# 修订：2026-10-17 17:39 新增 load_diff，按主键比较后仅导入变化的数据
 
+import json
+import time
 from dataclasses import dataclass
+from hashlib import md5
 from operator import itemgetter
-from typing import Callable, Iterable, Optional
+from typing import Callable, Iterable, Optional, Union
 
 from orange.shell import Path
-from orange.utils.htutil import classproperty
+from orange.utils.datetime_ import now
+from orange.utils.htutil import classproperty, split
 
-from .sqlite import Connection
+from .sqlite import (
+    BULK_PRAGMAS,
+    Connection,
+    LoadError,
+    LoadResult,
+    Values,
+    upsert_sql,
+)
 from .xlsx import Book, Header
 
 
@@ -25,6 +38,34 @@ def convdata(data: Iterable, convfunc: Callable[[list], list]) -> Iterable:
     yield from filter(None, map(convfunc, data))
 
 
+def read_file(path: Path) -> Iterable:
+    """
+    按文件类型读取数据：
+    Excel 文件读取第一张工作表，csv、del 文件按 csv 格式读取，其他文件使用 read_data 读取
+    """
+    path = Path(path)
+    if path.lsuffix.startswith(".xls"):
+        from .excel import read_excel
+
+        return read_excel(path, sheets=0)
+    elif path.lsuffix in (".csv", ".del"):
+        return path.iter_csv()
+    return path.read_data()
+
+
+def row_hash(row: Iterable) -> bytes:
+    "计算行的校验值，用于比较数据是否变化"
+    txt = "\x1f".join("" if x is None else str(x) for x in row)
+    return md5(txt.encode("utf8")).digest()
+
+
+def _read_file(reader: Callable[[Path], Iterable], path: Path) -> tuple[list, float]:
+    "在子进程中读取文件，返回数据及耗时"
+    start = time.perf_counter()
+    data = list(reader(path))
+    return data, time.perf_counter() - start
+
+
 @dataclass
 class Column:
     header: str = ""  # 标题，Excel 使用
@@ -66,8 +107,8 @@ class Table(object):
         return {k: v for k, v in cls.__dict__.items() if isinstance(v, Column)}
 
     @classmethod
-    def create_table(cls, db: Connection, print_sql: bool = False):
-        "创建数据库表"
+    def create_sql(cls) -> tuple[str, list[str]]:
+        "生成建表语句及建索引语句"
         if not (cls.tablename and isinstance(cls.tablename, str)):
             raise Exception("tablename 未定义")
         Columns = cls.Columns
@@ -84,18 +125,29 @@ class Table(object):
             + "\n".join(fields)
             + "\n);"
         )
+        indexes = [
+            f"create index if not exists {cls.tablename}_{name} on {cls.tablename}({name})"
+            for name, column in Columns.items()
+            if column.has_index
+        ]
+        return sql, indexes
+
+    @classmethod
+    def create_table(cls, db: Connection, print_sql: bool = False):
+        "创建数据库表"
+        if db:
+            sql, indexes = db.cached_sql(("create_table", cls), cls.create_sql)
+        else:
+            sql, indexes = cls.create_sql()
         if print_sql:
             print(sql)
         if db:
             db.execute(sql)
+            # 创建索引
+            for indexsql in indexes:
+                db.execute(indexsql)
         else:
             print("数据库未定义")
-        # 创建索引
-        for name, column in Columns.items():
-            if column.has_index:
-                db.execute(
-                    f"create index if not exists {cls.tablename}_{name} on {cls.tablename}({name})"
-                )
 
     @classmethod
     def load(
@@ -108,23 +160,219 @@ class Table(object):
         loadcheck: bool = False,
         clear: bool = False,
         print_result: bool = True,
-    ):
-        "导入数据"
-
-        with db:
+        chunksize: int = 0,
+        bulk: Union[bool, dict] = False,
+        changed_only: bool = False,
+    ) -> LoadResult:
+        """
+        导入数据，chunksize、bulk 参数参见 Connection.load，返回 LoadResult
+        method 为 upsert 时，按 is_pk 定义的主键更新其他字段，
+        changed_only 为真时，仅更新内容发生变化的行
+        """
+        fields, keys = len(cls.Columns), None
+        if method == "upsert":
+            fields = list(cls.Columns)
+            keys = [name for name, c in cls.Columns.items() if c.is_pk]
+        pragmas = {}
+        if bulk:
+            pragmas = BULK_PRAGMAS if bulk is True else bulk
+            chunksize = chunksize or 100000
+        with db.pragmas(**pragmas), db:
             if loadcheck and path:
                 db.lcheck(cls.tablename, path, path.mtime)
             if convfunc:
                 data = convdata(data, convfunc)
-            db.load(
+            return db.load(
                 cls.tablename,
-                len(cls.Columns),
+                fields,
                 data,
                 method=method,
                 clear=clear,
                 print_result=print_result,
+                chunksize=chunksize,
+                keys=keys,
+                changed_only=changed_only,
             )
 
+    @classmethod
+    def load_files(
+        cls,
+        db: Connection,
+        paths: Iterable,
+        reader: Callable[[Path], Iterable] = read_file,
+        convfunc: Optional[Callable[[list], list]] = None,
+        method: str = "insert",
+        loadcheck: bool = True,
+        workers: Optional[int] = None,
+        print_result: bool = True,
+    ) -> int:
+        """
+        导入多个文件，在进程池中并行读取文件，读取完成的文件在当前线程中逐个导入，
+        每个文件一个事务，返回导入的行数，参数说明：
+        paths:    文件清单
+        reader:   读取文件的函数，原型为：reader(path)->rows，需可在进程间传递，
+                  如模块级函数或 functools.partial(Path.read_data, encoding="utf8")
+        convfunc: 按行转换程序，在当前线程中执行
+        loadcheck:是否检查文件重复导入，已导入的文件将被跳过
+        workers:  进程数，默认为 CPU 核数
+        同时读取的文件最多为进程数的两倍，每个文件导入后即释放其数据
+        """
+        from orange.utils.htutil import pool_starmap
+
+        if loadcheck:  # 先批量排除已导入的文件，避免重复读取
+            paths = db.loadfile.check_files(cls.tablename, paths)
+        total = files = 0
+        tasks = ((reader, path) for path in map(Path, paths))
+        for (_, path), (data, read_time) in pool_starmap(
+            _read_file, tasks, workers, ordered=False
+        ):
+            files += 1
+            start = time.perf_counter()
+            try:
+                result = cls.load(
+                    db,
+                    data,
+                    convfunc,
+                    path=path,
+                    method=method,
+                    loadcheck=loadcheck,
+                    print_result=False,
+                )
+            except LoadError as e:
+                if print_result:
+                    print(e)
+                continue
+            load_time = time.perf_counter() - start
+            count = result.rowcount  # 实际导入的行数，不含转换时丢弃及忽略的行
+            total += count
+            if print_result:
+                speed = count / (read_time + load_time or 1)
+                print(
+                    f"{path.name}：读取 {len(data):,d} 行，导入 {count:,d} 行，"
+                    f"读取 {read_time:.2f} 秒，导入 {load_time:.2f} 秒，"
+                    f"速度：{speed:,.0f} 行/秒"
+                )
+        if print_result:
+            print(f"导入文件：{files:,d} 个，导入数量：{total:,d}")
+        return total
+
+    @classmethod
+    def load_diff(
+        cls,
+        db: Connection,
+        data: Iterable,
+        convfunc: Optional[Callable[[list], list]] = None,
+        path: Optional[Path] = None,
+        loadcheck: bool = False,
+        changelog: bool = True,
+        batchsize: int = 10000,
+        print_result: bool = True,
+    ) -> tuple[int, int, int]:
+        """
+        导入全量数据，按主键与表中现有数据比较，仅新增、更新、删除发生变化的行，
+        返回新增、更新、删除的行数，参数说明：
+        data:      全量数据，列的顺序与 Columns 一致
+        changelog: 是否在 {tablename}_log 表中记录变化情况
+        batchsize: 每批写入的行数
+        导入的数据先写入与本表字段类型相同的临时表，以与表中数据相同的类型比较，
+        如 real 字段的 "1.50" 与已存储的 1.5 视为相同。全量数据中主键重复时报错，
+        所有变化均回滚
+        """
+        Columns = cls.Columns
+        fields = list(Columns)
+        keys = [name for name, c in Columns.items() if c.is_pk]
+        if not keys:
+            raise Exception("主键未定义")
+        key_idx = [fields.index(key) for key in keys]
+        getkey = itemgetter(*key_idx)
+        if len(key_idx) == 1:
+            getkey = (lambda get: lambda row: (get(row),))(getkey)
+        insert_sql = f"insert into {cls.tablename} {Values(len(fields))}"
+        update_sql = upsert_sql(cls.tablename, fields, keys)
+        delete_sql = (
+            f"delete from {cls.tablename} where "
+            + " and ".join(f"{key}=?" for key in keys)
+        )
+        log_table = f"{cls.tablename}_log"
+        log_sql = f"insert into {log_table} values(?,?,?,?)"
+        temp_table = f"_diff_{cls.tablename}"
+        temp_fields = ",".join(f"{name} {c._type}" for name, c in Columns.items())
+        counts = {"insert": 0, "update": 0, "delete": 0}
+
+        def dumps(value):
+            return json.dumps(value, ensure_ascii=False)
+
+        with db:
+            if loadcheck and path:
+                db.lcheck(cls.tablename, path, path.mtime)
+            if changelog:
+                db.execute(
+                    f"create table if not exists {log_table}("
+                    "time text,op text,key text,data text)"
+                )
+            db.execute(f"create temp table if not exists {temp_table}({temp_fields})")
+            stamp = now() % "%F %T"
+
+            def normalize(rows: list) -> list:
+                "经临时表转换成与数据库相同的类型"
+                db.execute(f"delete from {temp_table}")
+                db.executemany(f"insert into {temp_table} {Values(len(fields))}", rows)
+                return db.fetch(
+                    f"select {','.join(fields)} from {temp_table} order by rowid"
+                )
+
+            def apply(op: str, sql: str, rows: list):
+                db.executemany(sql, rows)
+                counts[op] += len(rows)
+                if changelog:
+                    if op == "delete":  # 删除的行仅记录主键
+                        logs = ([stamp, op, dumps(key), None] for key in rows)
+                    else:
+                        logs = (
+                            [stamp, op, dumps(getkey(row)), dumps(row)]
+                            for row in rows
+                        )
+                    db.executemany(log_sql, logs)
+
+            current = {
+                getkey(row): row_hash(row)
+                for row in db.iterfetch(
+                    f"select {','.join(fields)} from {cls.tablename}"
+                )
+            }
+            if convfunc:
+                data = convdata(data, convfunc)
+            seen, duplicates = set(), []
+            for rows in split(data, batchsize):
+                inserts, updates = [], []
+                for row in normalize(rows):
+                    key = getkey(row)
+                    if key in seen:
+                        duplicates.append(key)
+                        continue
+                    seen.add(key)
+                    old = current.pop(key, None)
+                    if old is None:
+                        inserts.append(row)
+                    elif old != row_hash(row):
+                        updates.append(row)
+                if inserts:
+                    apply("insert", insert_sql, inserts)
+                if updates:
+                    apply("update", update_sql, updates)
+            db.execute(f"drop table {temp_table}")
+            if duplicates:
+                raise Exception(
+                    f"{cls.tablename} 主键重复 {len(duplicates):,d} 条，"
+                    f"如：{'、'.join(map(dumps, duplicates[:10]))}"
+                )
+            for keys in split(current, batchsize):  # 剩余的为已删除的行
+                apply("delete", delete_sql, keys)
+        result = counts["insert"], counts["update"], counts["delete"]
+        if print_result:
+            print("新增：{:,d} 条，更新：{:,d} 条，删除：{:,d} 条".format(*result))
+        return result
+
     @classmethod
     def export(
         cls,
@@ -137,10 +385,13 @@ class Table(object):
         convfunc: Optional[Callable] = None,
         **kw,
     ):
-        "导出数据"
+        """
+        导出数据，未指定 convfunc 时分批读取查询结果并流式写入；
+        指定 convfunc 时仍读取全部数据，以列表形式传入 convfunc
+        """
         from .xlsx import write_excel
         if path is not None:
-            with write_excel(path) as book:
+            with write_excel(path, options={"constant_memory": True}) as book:
                 cls.export(
                     db=db,
                     book=book,
@@ -153,9 +404,10 @@ class Table(object):
         else:
             if not sql:  # 生成默认的 sql 语句
                 sql = f"select {fields or '*'} from {cls.tablename}"
-            data = db.fetch(sql)
-            if convfunc:
-                data = convfunc(data)  # 如果送入转换函数，进行数据转换
+            if convfunc:  # 转换函数可能需要 len、索引或多次遍历，仍传入列表
+                data = convfunc(db.fetch(sql))
+            else:
+                data = db.iterfetch(sql)
             if not sheetname:
                 sheetname = cls.tablename
             Columns = cls.Columns
@@ -164,7 +416,7 @@ class Table(object):
             else:
                 Headers = [f.Header for f in cls.Columns.values()]
             if book:
-                book.add_table(sheet=sheetname, data=data, columns=Headers, **kw)
+                book.write_table(sheet=sheetname, data=data, columns=Headers, **kw)
 
 
 includer = itemgetter
@@ -5,9 +5,24 @@
 # Email:huangtao.sh@icloud.com
 # 创建：2018-09-27 19:27
 
+from .aggregate import (
+    Count,
+    Distinct,
+    First,
+    HyperLogLog,
+    Last,
+    Max,
+    Min,
+    Sum,
+    aggregate,
+)
 from .click import arg, command
 from .data import (
     Data,
+    batch_converter,
+    batch_filterer,
+    batch_hasher,
+    batch_includer,
     convdata,
     converter,
     excluder,
@@ -41,6 +56,7 @@ from .htutil import (
     groupby,
     last,
     limit,
+    pool_starmap,
     suppress,
     timeit,
 )
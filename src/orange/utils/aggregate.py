@@ -0,0 +1,245 @@
+# 项目：公共函数库
+# 模块：流式分组汇总
+# 作者：黄涛
+# License:GPL
+# Email:huangtao.sh@icloud.com
+# 创建：2026-10-17 17:58
+
+"""
+流式分组汇总，每组仅保存汇总值，不保存原始数据，使用方法：
+for org, cnt, amt, last in aggregate(data, 0, Count(), Sum(2), Last(3)):
+    ...
+数据已按分组排序时，可指定 sorted=True，分组变化时即返回结果，仅保存当前分组
+"""
+
+from math import log
+from operator import itemgetter
+from typing import Callable, Iterable, Iterator, Optional, Union
+
+_MASK64 = (1 << 64) - 1
+
+
+def _mix64(x: int) -> int:
+    "splitmix64 混合函数，使 hash 值的各位分布均匀"
+    x = (x + 0x9E3779B97F4A7C15) & _MASK64
+    x = ((x ^ (x >> 30)) * 0xBF58476D1CE4E5B9) & _MASK64
+    x = ((x ^ (x >> 27)) * 0x94D049BB133111EB) & _MASK64
+    return x ^ (x >> 31)
+
+
+class HyperLogLog:
+    """
+    基数估计，内存占用为 2**p 字节，标准误差约为 1.04 / sqrt(2**p)，
+    p=14 时约为 0.8%。使用 Python 的 hash，仅在同一进程内可合并
+    """
+
+    __slots__ = "p", "m", "registers"
+
+    def __init__(self, p: int = 14):
+        if not 4 <= p <= 16:
+            raise Exception("p 的取值范围为 4 至 16")
+        self.p, self.m = p, 1 << p
+        self.registers = bytearray(self.m)
+
+    def add(self, value):
+        x = _mix64(hash(value) & _MASK64)
+        index, w = x & (self.m - 1), x >> self.p
+        rank = 64 - self.p - w.bit_length() + 1
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+
+    def merge(self, other: "HyperLogLog"):
+        "合并另一个相同精度的估计"
+        self.registers = bytearray(map(max, self.registers, other.registers))
+
+    def count(self) -> int:
+        m = self.m
+        alpha = 0.7213 / (1 + 1.079 / m)
+        estimate = alpha * m * m / sum(2.0**-r for r in self.registers)
+        if estimate <= 2.5 * m and (zeros := self.registers.count(0)):
+            estimate = m * log(m / zeros)  # 基数较小时使用线性计数
+        return round(estimate)
+
+    __len__ = count
+
+
+def _getter(column) -> Callable:
+    "列序号转换成取值函数"
+    if column is None:
+        raise Exception("未指定汇总的列")
+    if callable(column):
+        return column
+    if isinstance(column, (tuple, list)):
+        return itemgetter(*column)
+    return itemgetter(column)
+
+
+class Agg:
+    """
+    汇总函数的基类，column 为列序号或取值函数 func(row)->value，
+    子类实现 first、update、result：
+    first(value)->state:          分组的第一个值
+    update(state, value)->state:  后续的值
+    result(state)->value:         汇总结果
+    """
+
+    __slots__ = ("get",)
+
+    def __init__(self, column):
+        self.get = _getter(column)
+
+    def first(self, value):
+        return value
+
+    def result(self, state):
+        return state
+
+
+class Count(Agg):
+    "行数"
+
+    __slots__ = ()
+
+    def __init__(self):
+        super().__init__(lambda row: None)
+
+    def first(self, value):
+        return 1
+
+    def update(self, state, value):
+        return state + 1
+
+
+class Sum(Agg):
+    "合计"
+
+    __slots__ = ()
+
+    def update(self, state, value):
+        return state + value
+
+
+class Min(Agg):
+    "最小值"
+
+    __slots__ = ()
+
+    def update(self, state, value):
+        return value if value < state else state
+
+
+class Max(Agg):
+    "最大值"
+
+    __slots__ = ()
+
+    def update(self, state, value):
+        return value if value > state else state
+
+
+class First(Agg):
+    "第一个值"
+
+    __slots__ = ()
+
+    def update(self, state, value):
+        return state
+
+
+class Last(Agg):
+    "最后一个值"
+
+    __slots__ = ()
+
+    def update(self, state, value):
+        return value
+
+
+class Distinct(Agg):
+    """
+    不重复值的数量，exact 为真时使用集合精确计算；否则先使用集合，
+    不重复值超过 threshold 个后改用 HyperLogLog 估计，以免每组均占用 2**p 字节。
+    threshold 默认为 2**p / 64，此时集合与 HyperLogLog 的内存占用相近
+    """
+
+    __slots__ = "p", "exact", "threshold"
+
+    def __init__(
+        self,
+        column,
+        p: int = 14,
+        exact: bool = False,
+        threshold: Optional[int] = None,
+    ):
+        super().__init__(column)
+        self.p, self.exact = p, exact
+        self.threshold = threshold or max(16, (1 << p) >> 6)
+
+    def first(self, value):
+        return {value}
+
+    def update(self, state, value):
+        state.add(value)
+        if (
+            not self.exact
+            and isinstance(state, set)
+            and len(state) > self.threshold
+        ):
+            hll = HyperLogLog(self.p)
+            for x in state:
+                hll.add(x)
+            return hll
+        return state
+
+    def result(self, state):
+        return len(state)
+
+
+def aggregate(
+    data: Iterable,
+    key: Union[int, tuple, list, Callable],
+    *aggs: Agg,
+    sorted: bool = False,
+) -> Iterator[list]:
+    """
+    流式分组汇总，每组返回：[分组, 汇总值...]，key 为多列时分组展开为多列
+    key:    分组的列序号、多列的序号或函数 func(row)->key
+    aggs:   汇总函数，如 Count()、Sum(2)、Min(3)、Max(3)、First(1)、Last(1)、Distinct(0)
+    sorted: 数据已按分组排序，分组变化时即返回结果，内存占用与分组数量无关
+    """
+    keyfunc = _getter(key)
+    expand = isinstance(key, (tuple, list)) and len(key) > 1
+    getters = [agg.get for agg in aggs]
+
+    def output(k, states) -> list:
+        results = [agg.result(s) for agg, s in zip(aggs, states)]
+        return [*k, *results] if expand else [k, *results]
+
+    if sorted:
+        current, states = None, None
+        for row in data:
+            k = keyfunc(row)
+            values = [get(row) for get in getters]
+            if states is None or k != current:
+                if states is not None:
+                    yield output(current, states)
+                current = k
+                states = [agg.first(v) for agg, v in zip(aggs, values)]
+            else:
+                states = [
+                    agg.update(s, v) for agg, s, v in zip(aggs, states, values)
+                ]
+        if states is not None:
+            yield output(current, states)
+        return
+
+    groups = {}
+    for row in data:
+        k = keyfunc(row)
+        values = [get(row) for get in getters]
+        if (states := groups.get(k)) is None:
+            groups[k] = [agg.first(v) for agg, v in zip(aggs, values)]
+        else:
+            groups[k] = [agg.update(s, v) for agg, s, v in zip(aggs, states, values)]
+    for k, states in groups.items():
+        yield output(k, states)
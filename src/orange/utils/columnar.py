@@ -0,0 +1,333 @@
+# 项目：公共函数库
+# 模块：按列存储的数据
+# 作者：黄涛
+# License:GPL
+# Email:huangtao.sh@icloud.com
+# 创建：2026-10-17 17:57
+# 修订：2026-10-17 18:12 from_rows 逐行写入各列的缓冲区，整数列遇到小数时改为浮点数列
+
+"""
+按列存储数据，数值列使用 numpy 数组存储，支持按列过滤、选取列、分组汇总，
+分组时不再逐行建立字典。未安装 numpy 时，数值列使用 array 存储，按行计算
+"""
+
+from array import array
+from itertools import chain, compress
+from operator import index
+from typing import Iterable, Optional, Union
+
+try:
+    import numpy as np
+except ImportError:  # numpy 为可选依赖
+    np = None
+
+_TYPECODES = {"int": "q", "float": "d", "text": None}
+
+
+def column_kind(_type: str) -> str:
+    "根据数据库字段类型判断列的类型：int、float 或 text"
+    _type = (_type or "").lower()
+    if "int" in _type:
+        return "int"
+    if any(x in _type for x in ("real", "floa", "doub", "num", "dec")):
+        return "float"
+    return "text"
+
+
+def infer_kind(value) -> str:
+    "根据数据判断列的类型"
+    if isinstance(value, bool):
+        return "text"
+    if isinstance(value, int):
+        return "int"
+    if isinstance(value, float):
+        return "float"
+    return "text"
+
+
+def _number(conv):
+    def _(value):
+        return conv(value) if value not in ("", None) else 0
+
+    return _
+
+
+def make_column(values: Iterable, kind: str):
+    "按类型生成列，数值列中的空值按 0 处理"
+    if kind == "text":
+        values = list(values)
+        return np.array(values, dtype=object) if np else values
+    conv = _number(int if kind == "int" else float)
+    if np:
+        dtype = np.int64 if kind == "int" else np.float64
+        return np.fromiter(map(conv, values), dtype)
+    return array(_TYPECODES[kind], map(conv, values))
+
+
+_INT64 = range(-(1 << 63), 1 << 63)
+
+
+def _number_value(value, kind: str):
+    """
+    数值列中不能直接存入的值，空值按 0 处理，
+    整数列遇到小数或超出 int64 范围的整数时返回 float
+    """
+    if value in ("", None):
+        return 0
+    if kind == "float" or isinstance(value, float):
+        return float(value)
+    if isinstance(value, str):
+        try:
+            value = int(value)
+        except ValueError:
+            return float(value)
+    else:
+        try:
+            value = index(value)
+        except TypeError:
+            value = float(value)
+            if not value.is_integer():
+                return value
+            value = int(value)
+    return value if value in _INT64 else float(value)
+
+
+def _read_rows(rows: Iterable, kinds: list) -> list:
+    """
+    逐行写入各列的缓冲区，数值列使用 array，不再先转置成按列的元组，
+    整数列遇到小数时改为浮点数列，kinds 随之修改。列数不足的行以空值补齐
+    """
+    width = len(kinds)
+    buffers = [[] if kind == "text" else array(_TYPECODES[kind]) for kind in kinds]
+    appends = [buf.append for buf in buffers]
+    for n, row in enumerate(rows):
+        if len(row) < width:
+            row = [*row, *[""] * (width - len(row))]
+        try:
+            for append, value in zip(appends, row):
+                append(value)
+        except (TypeError, OverflowError):  # 需要转换的值，补齐本行未写入的列
+            for i, value in enumerate(row[:width]):
+                if len(buffers[i]) > n:
+                    continue
+                if kinds[i] != "text":
+                    value = _number_value(value, kinds[i])
+                if kinds[i] == "int" and isinstance(value, float):
+                    kinds[i], buffers[i] = "float", array("d", buffers[i])
+                    appends[i] = buffers[i].append
+                appends[i](value)
+    return buffers
+
+
+def _to_column(buf, kind: str):
+    "缓冲区转换成列"
+    if not np:
+        return buf
+    if kind == "text":
+        return make_column(buf, kind)
+    return np.frombuffer(buf, np.int64 if kind == "int" else np.float64)
+
+
+class ColumnData:
+    """
+    按列存储的数据，使用方法：
+    cols = Data(rows).to_columns(header=["机构", "币种", "金额"], types=["text", "text", "real"])
+    big = cols.filter(cols["金额"] > 10000)       # 过滤，条件为布尔数组
+    result = big.groupby("机构", "币种").sum("金额")  # 分组汇总，返回 ColumnData
+    result.rows()                                 # 转换为按行的数据
+    """
+
+    __slots__ = "names", "columns", "kinds"
+
+    def __init__(self, names: list[str], columns: list, kinds: list[str]):
+        self.names = list(names)
+        self.columns = dict(zip(self.names, columns))
+        self.kinds = dict(zip(self.names, kinds))
+
+    @classmethod
+    def from_rows(
+        cls,
+        rows: Iterable,
+        header: Union[list, type, None] = None,
+        types: Optional[list] = None,
+    ) -> "ColumnData":
+        """
+        将按行的数据转换成按列存储
+        header: 列名，也可以为 Table 的子类，此时列名及类型均取自其 Columns
+        types:  各列的数据库字段类型，如 int、real、text；为空时根据首行数据判断
+        整数列中出现小数时，该列改为 float
+        """
+        if Columns := getattr(header, "Columns", None):
+            header = list(Columns)
+            types = types or [c._type for c in Columns.values()]
+        rows = iter(rows)
+        head = [first] if (first := next(rows, None)) is not None else []
+        header = list(header or (f"c{i}" for i in range(len(first or ()))))
+        if types:
+            kinds = [column_kind(t) for t in types]
+        elif head:
+            kinds = [infer_kind(value) for value in first]
+        else:
+            kinds = ["text"] * len(header)
+        kinds = kinds[: len(header)]
+        buffers = _read_rows(chain(head, rows), kinds)
+        columns = [_to_column(buf, kind) for buf, kind in zip(buffers, kinds)]
+        return cls(header, columns, kinds)
+
+    def __len__(self) -> int:
+        return len(self.columns[self.names[0]]) if self.names else 0
+
+    def __getitem__(self, name: str):
+        return self.columns[name]
+
+    def __repr__(self):
+        return f"ColumnData({len(self):,d} 行，列：{','.join(self.names)})"
+
+    def _new(self, names: list, columns: list) -> "ColumnData":
+        return ColumnData(names, columns, [self.kinds[name] for name in names])
+
+    def select(self, *names: str) -> "ColumnData":
+        "选取列"
+        return self._new(list(names), [self.columns[name] for name in names])
+
+    def filter(self, mask: Iterable[bool]) -> "ColumnData":
+        "按条件过滤，mask 为与行数相同的布尔数组，如：cols['金额'] > 0"
+        if np:
+            mask = np.asarray(mask, dtype=bool)
+            return self._new(self.names, [col[mask] for col in self.columns.values()])
+        mask = list(mask)
+        return self._new(
+            self.names,
+            [_retype(col, compress(col, mask)) for col in self.columns.values()],
+        )
+
+    def take(self, index) -> "ColumnData":
+        "按行序号选取数据"
+        if np:
+            return self._new(self.names, [col[index] for col in self.columns.values()])
+        return self._new(
+            self.names,
+            [
+                _retype(col, map(col.__getitem__, index))
+                for col in self.columns.values()
+            ],
+        )
+
+    def groupby(self, *keys: str) -> "GroupBy":
+        "按指定的列分组"
+        return GroupBy(self, keys)
+
+    def sum(self, name: str):
+        "汇总"
+        col = self.columns[name]
+        return col.sum().item() if np else sum(col)
+
+    def count(self) -> int:
+        return len(self)
+
+    def rows(self) -> list[list]:
+        "转换成按行的数据"
+        columns = [
+            col.tolist() if hasattr(col, "tolist") else col
+            for col in self.columns.values()
+        ]
+        return [list(row) for row in zip(*columns)]
+
+
+def _retype(col, values: Iterable):
+    "生成与 col 同类型的列"
+    return array(col.typecode, values) if isinstance(col, array) else list(values)
+
+
+def factorize(col) -> tuple:
+    "将列转换成分组序号，返回：各行的分组序号、分组数量"
+    if np and col.dtype != object:
+        _, inverse = np.unique(col, return_inverse=True)
+        return inverse.reshape(-1), int(inverse.max(initial=-1)) + 1
+    codes = {}
+    setdefault = codes.setdefault
+    inverse = [setdefault(x, len(codes)) for x in col]
+    if np:
+        inverse = np.array(inverse, dtype=np.intp)
+    return inverse, len(codes)
+
+
+class GroupBy:
+    "分组，各行的分组序号在建立时一次计算完成"
+
+    __slots__ = "data", "keys", "inverse", "ngroups"
+
+    def __init__(self, data: ColumnData, keys: Iterable[str]):
+        self.data = data
+        self.keys = list(keys)
+        inverse, ngroups = None, 1
+        for key in self.keys:
+            codes, n = factorize(data[key])
+            if inverse is None:
+                inverse, ngroups = codes, n
+            elif np:
+                inverse, ngroups = factorize(inverse * n + codes)
+            else:
+                inverse, ngroups = factorize(
+                    [a * n + b for a, b in zip(inverse, codes)]
+                )
+        self.inverse = inverse
+        self.ngroups = ngroups if inverse is not None else 0
+
+    def _first(self):
+        "每组第一行的行序号"
+        if np:
+            first = np.empty(self.ngroups, dtype=np.intp)
+            rows = np.arange(len(self.inverse))
+            first[self.inverse[::-1]] = rows[::-1]
+            return first
+        first = {}
+        for row, group in enumerate(self.inverse):
+            first.setdefault(group, row)
+        return [first[g] for g in range(self.ngroups)]
+
+    def _result(self, names: list, columns: list, kinds: list) -> ColumnData:
+        keys = self.data.select(*self.keys).take(self._first())
+        return ColumnData(
+            keys.names + names,
+            list(keys.columns.values()) + columns,
+            list(keys.kinds.values()) + kinds,
+        )
+
+    def _count(self):
+        if np:
+            return np.bincount(self.inverse, minlength=self.ngroups)
+        result = array("q", bytes(8 * self.ngroups))
+        for group in self.inverse:
+            result[group] += 1
+        return result
+
+    def _sum(self, name: str):
+        col, kind = self.data[name], self.data.kinds[name]
+        if kind == "text":
+            raise Exception(f"{name} 不是数值列，不能汇总")
+        if np:
+            if kind == "float":
+                return np.bincount(self.inverse, col, minlength=self.ngroups)
+            result = np.zeros(self.ngroups, dtype=col.dtype)
+            np.add.at(result, self.inverse, col)
+            return result
+        result = array(_TYPECODES[kind], bytes(8 * self.ngroups))
+        for group, value in zip(self.inverse, col):
+            result[group] += value
+        return result
+
+    def count(self, name: str = "count") -> ColumnData:
+        "各组的行数"
+        return self._result([name], [self._count()], ["int"])
+
+    def sum(self, *names: str, count: bool = False) -> ColumnData:
+        "各组指定列的合计，count 为真时增加行数列"
+        columns = [self._sum(name) for name in names]
+        kinds = [self.data.kinds[name] for name in names]
+        names = list(names)
+        if count:
+            names.append("count")
+            columns.append(self._count())
+            kinds.append("int")
+        return self._result(names, columns, kinds)
@@ -5,15 +5,25 @@
 # Email:huangtao.sh@icloud.com
 # 创建：2019-04-25 11:09
 # 修改：2025-01-23 15:07 新增 convdata 函数
+# 修订：2026-10-17 17:53 Data 的处理步骤合并成一个函数执行，选取列合并为一次
+# 修订：2026-10-17 17:55 新增批量处理模式，Data.batches 按批返回数据
+# 修订：2026-10-17 17:56 新增 Data.parallel，多进程执行处理步骤
+# 修订：2026-10-17 17:57 新增 Data.to_columns，转换成按列存储的数据
+# 修订：2026-10-17 17:58 新增 Data.aggregate 流式分组汇总，修正 groupby 未调用 key 的问题
+# 修订：2026-10-17 18:11 选取列、按列转换的列序号不再以 repr 写入生成的代码
+# 修订：2026-10-17 18:11 hasher、hashfilter 改为可在进程间传递，parallel 执行可传递的前几个步骤
 
 """
 本模块为数据转换模块，旨在提供一个数据转换工具和若干标准的转换程序
 """
 
-from operator import itemgetter
-from typing import Callable, Iterable
+from collections import deque
+from functools import partial
+from itertools import chain, repeat
+from operator import itemgetter, setitem
+from typing import Callable, Iterable, Optional
 
-from .htutil import get_md5, limit, split, tprint
+from .htutil import get_md5, limit, pool_starmap, split, tprint
 
 
 def convdata(data: Iterable, convfunc: Callable[[list], list]) -> Iterable:
@@ -21,26 +31,151 @@ def convdata(data: Iterable, convfunc: Callable[[list], list]) -> Iterable:
     yield from filter(None, map(convfunc, data))
 
 
-def filterer(func: Callable) -> Callable:
+def stage(kind: str, arg) -> Callable[[Iterable], Iterable]:
     """
-    过滤器，参数中的函数为：func(row)->bool
+    生成处理步骤，可单独使用：stage(data)，也可由 Data 合并执行。
+    步骤记录在 stage 属性中，kind 为：
+    map:     arg 为 func(row)->row
+    filter:  arg 为 func(row)->bool，为 None 时过滤空行
+    select:  arg 为需要包含的列
+    exclude: arg 为需要排除的列
+    convert: arg 为 {列序号: func(col)->col}
+    slice:   arg 为 slice 对象
+    batch:   arg 为 func(rows)->rows，按批处理数据，参见 batch_converter 等
     """
+    proc = compile_stages([(kind, arg)])
 
     def _(data):
-        return filter(func, data)
+        return proc(data)
 
+    _.stage = kind, arg
     return _
 
 
-def mapper(func: Callable):
+def _merge(stages: list) -> list:
+    "合并连续的选取列"
+    result = []
+    for kind, arg in stages:
+        if kind == "select" and result and result[-1][0] == "select":
+            prev = result[-1][1]
+            result[-1] = kind, [prev[col] for col in arg]
+        else:
+            result.append((kind, list(arg) if kind == "select" else arg))
+    return result
+
+
+BATCH_SIZE = 10000  # 批量处理模式下每批的行数
+
+
+def compile_stages(
+    stages: list, batch: bool = False
+) -> Callable[[Iterable], Iterable]:
     """
-    映射器，可以把一个函数映射，函数原型为： func(row)->row
+    将处理步骤合并成一个生成器函数，每行数据只需一次循环，选取列、按列转换等步骤
+    直接生成代码，不再调用函数。
+    batch 为真时，输入及输出均为按批拆分的数据 [][]row，每批数据逐行处理后，
+    再交给按批处理的步骤，每批只产生一次返回
     """
+    stages = _merge(stages)
+    if not batch and any(kind == "batch" for kind, _ in stages):
+        # 含按批处理的步骤，拆分成批处理后再合并
+        proc = compile_stages(stages, True)
+        return lambda data: chain.from_iterable(proc(split(data, BATCH_SIZE)))
+    if not batch and len(stages) == 1 and stages[0][0] in ("map", "filter"):
+        # 单个映射或过滤直接使用内置函数
+        kind, func = stages[0]
+        if kind == "map":
+            return lambda data: map(func, data)
+        return lambda data: filter(func, data)
+    env, lines, body = {}, [], []
+    for i, (kind, arg) in enumerate(stages):
+        name = f"_f{i}"
+        if kind == "batch":
+            env[name] = arg
+            body.extend(_batch_loop(lines))
+            body.append(f"rows = {name}(rows)")
+            lines = []
+        elif kind == "map":
+            env[name] = arg
+            lines.append(f"row = {name}(row)")
+        elif kind == "filter":
+            if arg is None:
+                lines.append("if not row: continue")
+            else:
+                env[name] = arg
+                lines.append(f"if not {name}(row): continue")
+        elif kind == "select":
+            # 列序号放入 env 中按名称引用，numpy 整数等不能用 repr 生成代码
+            cols = []
+            for j, col in enumerate(arg):
+                env[f"{name}_c{j}"] = col
+                cols.append(f"row[{name}_c{j}]")
+            lines.append(f"row = [{', '.join(cols)}]")
+        elif kind == "convert":
+            for j, (col, conv) in enumerate(arg.items()):
+                env[f"{name}_{j}"], env[f"{name}_c{j}"] = conv, col
+                lines.append(f"row[{name}_c{j}] = {name}_{j}(row[{name}_c{j}])")
+        elif kind == "exclude":
+            # 负数的列序号按 i - len(row) 判断，无需每行重建集合
+            env[name] = frozenset(x for x in arg if x >= 0)
+            if negative := frozenset(x for x in arg if x < 0):
+                env[f"{name}_n"] = negative
+                lines.append("n = len(row)")
+                cond = f"i not in {name} and i - n not in {name}_n"
+            else:
+                cond = f"i not in {name}"
+            lines.append(f"row = [x for i, x in enumerate(row) if {cond}]")
+        elif kind == "slice":
+            env[name] = arg
+            lines.append(f"row = row[{name}]")
+        else:
+            raise Exception(f"不支持的处理步骤：{kind}")
+    if batch:
+        body.extend(_batch_loop(lines))
+        source = [
+            "def _pipeline(data):",
+            "    for rows in data:",
+            *(f"        {line}" for line in body),
+            "        if rows:",
+            "            yield rows",
+        ]
+    else:
+        source = [
+            "def _pipeline(data):",
+            "    for row in data:",
+            *(f"        {line}" for line in lines),
+            "        yield row",
+        ]
+    exec(compile("\n".join(source), "<pipeline>", "exec"), env)
+    return env["_pipeline"]
+
+
+def _batch_loop(lines: list) -> list:
+    "生成逐行处理一批数据的代码"
+    if not lines:
+        return []
+    return [
+        "result = []",
+        "append = result.append",
+        "for row in rows:",
+        *(f"    {line}" for line in lines),
+        "    append(row)",
+        "rows = result",
+    ]
 
-    def _(data):
-        return map(func, data)
 
-    return _
+def filterer(func: Callable) -> Callable:
+    """
+    过滤器，参数中的函数为：func(row)->bool
+    """
+    return stage("filter", func)
+
+
+def mapper(func: Callable):
+    """
+    映射器，可以把一个函数映射，函数原型为： func(row)->row
+    """
+    return stage("map", func)
 
 
 def slicer(*args):
@@ -49,12 +184,7 @@ def slicer(*args):
     (stop) 或
     (start , stop [ , step ] )
     """
-    s = slice(*args)
-
-    def _(row):
-        return row[s]
-
-    return mapper(_)
+    return stage("slice", slice(*args))
 
 
 def converter(converter):
@@ -67,48 +197,117 @@ def converter(converter):
         1:func(col)->col
     }
     """
-
-    def _(row):
-        for idx, conv in converter.items():
-            row[idx] = conv(row[idx])
-        return row
-
-    return mapper(converter) if callable(converter) else mapper(_)
+    return stage("map" if callable(converter) else "convert", converter)
 
 
 def includer(*columns: Iterable):
     """
     仅包含指定的列，使用方法：includer(0,-2)
     """
-
-    def _(row):
-        return [row[col] for col in columns]
-
-    return mapper(_)
+    return stage("select", columns)
 
 
 def excluder(*columns):
     """
     排除指定的列，使用方法：excluder(0,-2)
     """
+    return stage("exclude", columns)
 
-    def _(row):
-        length = len(row)
-        exclude_columns = set(x if x >= 0 else x + length for x in columns)
-        return [item for i, item in enumerate(row) if i not in exclude_columns]
 
-    return mapper(_)
+def batch_filterer(func: Callable) -> Callable:
+    """
+    按批处理的过滤器，参数中的函数为：func(row)->bool
+    """
+    return stage("batch", lambda rows: list(filter(func, rows)))
 
 
-def _convert(converter: dict):
-    """数据转换"""
+def batch_converter(converter):
+    """
+    按批处理的转换器，格式同 converter，按列转换时逐列转换整批数据
+    """
+    if callable(converter):
+        return stage("batch", lambda rows: list(map(converter, rows)))
 
-    def _(row):
+    def _(rows):
         for idx, conv in converter.items():
-            row[idx] = conv(row[idx])
-        return row
+            values = map(conv, map(itemgetter(idx), rows))
+            deque(map(setitem, rows, repeat(idx), values), 0)
+        return rows
 
-    return _
+    return stage("batch", _)
+
+
+def batch_includer(*columns):
+    """
+    按批处理，仅包含指定的列，使用方法：batch_includer(0,-2)
+    """
+    getter = itemgetter(*columns)
+    if len(columns) == 1:
+        return stage("batch", lambda rows: [[x] for x in map(getter, rows)])
+    return stage("batch", lambda rows: list(map(list, map(getter, rows))))
+
+
+def _hash_rows(columns: tuple, rows: list) -> list:
+    texts = ("".join(row[x] for x in columns if row[x]) for row in rows)
+    return [[*row, md5] for row, md5 in zip(rows, map(get_md5, texts))]
+
+
+def batch_hasher(*columns):
+    """
+    按批处理，在行尾增加校验位，参数同 hasher
+    """
+    return stage("batch", partial(_hash_rows, columns))
+
+
+_worker_proc = None  # 子进程中已编译的处理步骤
+
+
+def _init_worker(stages: list):
+    global _worker_proc
+    _worker_proc = compile_stages(stages, True)
+
+
+def _run_batch(rows: list) -> list:
+    "在子进程中处理一批数据"
+    return next(_worker_proc([rows]), [])
+
+
+def picklable(obj) -> bool:
+    "判断对象能否在进程间传递"
+    import pickle
+
+    try:
+        pickle.dumps(obj)
+        return True
+    except Exception:
+        return False
+
+
+def parallel(
+    stages: list,
+    batches: Iterable[list],
+    workers: Optional[int] = None,
+    ordered: bool = True,
+) -> Iterable[list]:
+    """
+    在进程池中按批执行处理步骤，每个子进程只编译一次处理步骤，
+    未取走的结果最多为进程数的两倍
+    """
+    tasks = ((rows,) for rows in batches)
+    for _, rows in pool_starmap(
+        _run_batch, tasks, workers, ordered, _init_worker, (stages,)
+    ):
+        yield rows
+
+
+def _hash_row(columns: tuple, row) -> list:
+    txt = "".join(row[x] for x in columns if row[x])
+    return [*row, get_md5(txt)]
+
+
+def _hash_changed(hash_column: int, columns: tuple, row) -> bool:
+    txt = "".join(str(row[x]) for x in columns if row[x])
+    return row[hash_column] != get_md5(txt)
 
 
 def hasher(*columns):
@@ -116,43 +315,52 @@ def hasher(*columns):
     在行尾增加校验位，columns 指定需要校验的列，使用方法：
     hasher(-2,-1) # 对最后两列进行加密
     """
-
-    def _(row):
-        txt = "".join(row[x] for x in columns if row[x])
-        return [*row, get_md5(txt)]
-
-    return mapper(_)
+    return mapper(partial(_hash_row, columns))
 
 
 def hashfilter(*columns):
     """
     判断设置校验位的数据是否被修改，columns 为需要校验的列，最后一列为校验位
     """
-    hash_column = columns[-1]
-    columns = columns[:-1]
-
-    def _(row):
-        txt = "".join(str(row[x]) for x in columns if row[x])
-        return row[hash_column] != get_md5(txt)
-
-    return filterer(_)
+    return filterer(partial(_hash_changed, columns[-1], columns[:-1]))
 
 
 class Data:
-    __slots__ = "_data", "_rows", "_limit"
+    """
+    数据处理工具，处理步骤先记录下来，开始读取数据时合并成一个函数执行
+    """
+
+    __slots__ = "_data", "_rows", "_limit", "_stages"
 
     def __init__(self, data, *pipelines, header=None, rows=0, limit=0, **kw):
         self._data = iter(data)
+        self._stages = []
         if header:
             self.header(header)
         for proc in pipelines:
-            self._data = proc(self._data)
+            self.pipe(proc)
         for k, v in kw.items():
             getattr(self, k)(v)
         self._rows = rows
         self._limit = limit
 
+    def pipe(self, proc: Callable[[Iterable], Iterable]):
+        "增加处理步骤，由 stage 生成的步骤合并执行，其他函数直接处理数据"
+        if step := getattr(proc, "stage", None):
+            self._stages.append(step)
+        else:
+            self._compile()
+            self._data = proc(self._data)
+        return self
+
+    def _compile(self):
+        "将已记录的处理步骤合并成一个函数"
+        if self._stages:
+            self._data = compile_stages(self._stages)(self._data)
+            self._stages = []
+
     def header(self, header):
+        self._compile()
         for row in self._data:
             if all(x in row for x in header):
                 self.columns([row.index(title) for title in header])
@@ -168,33 +376,28 @@ class Data:
         return self
 
     def exclude(self, columns):
-        columns = set(columns)
-
-        def _(row):
-            return [col for i, col in enumerate(row) if i not in columns]
-
-        self._data = map(_, self._data)
+        self._stages.append(("exclude", columns))
+        return self
 
     def filter(self, filter_):
-        self._data = filter(filter_, self._data)
+        self._stages.append(("filter", filter_))
         return self
 
     def converter(self, converter):
         if converter:
-            if callable(converter):
-                self._data = map(converter, self._data)
-            else:
-                self._data = map(_convert(converter), self._data)
+            kind = "map" if callable(converter) else "convert"
+            self._stages.append((kind, converter))
         return self
 
     def include(self, columns):
         if columns:
-            self._data = itemgetter(*columns)(self._data)
+            self._stages.append(("select", columns))
         return self
 
     columns = include
 
     def __iter__(self):
+        self._compile()
         if self._rows:
             self._data = split(self._data, self._rows)
         elif self._limit:
@@ -204,7 +407,55 @@ class Data:
     def split(self, count=10000):
         self._rows = count
 
+    def batches(self, size: int = BATCH_SIZE) -> Iterable[list]:
+        """
+        批量处理模式：原始数据按 size 行拆分后逐批处理，按批返回数据。
+        经过滤后每批的行数可能少于 size。可直接用于 Connection.load 的分批导入
+        """
+        stages, self._stages = self._stages, []
+        if self._limit:
+            data = limit(compile_stages(stages)(self._data), self._limit)
+            return split(data, size)
+        return compile_stages(stages, True)(split(self._data, size))
+
+    def parallel(
+        self,
+        workers: Optional[int] = None,
+        chunksize: int = BATCH_SIZE,
+        ordered: bool = True,
+    ):
+        """
+        已记录的处理步骤在进程池中按 chunksize 行分批执行，之后增加的步骤仍在
+        当前进程中执行。适用于日期转换、正则提取、计算校验位等耗费 CPU 的转换程序。
+        workers: 进程数，默认为 CPU 核数
+        ordered: 是否保持原有顺序，否则按处理完成的顺序返回
+        从第一个不能在进程间传递的步骤（如 lambda 函数）起，仍在当前进程中执行
+        """
+        count = 0
+        for step in self._stages:
+            if not picklable(step):
+                break
+            count += 1
+        if count:
+            stages, self._stages = self._stages[:count], self._stages[count:]
+            batches = split(self._data, chunksize)
+            self._data = chain.from_iterable(
+                parallel(stages, batches, workers, ordered)
+            )
+        return self
+
+    def to_columns(self, header=None, types=None):
+        """
+        转换成按列存储的数据 ColumnData，支持按列过滤、分组汇总，参见 columnar 模块
+        header: 列名，也可以为 Table 的子类，此时列的类型取自 Column._type
+        types:  各列的数据库字段类型，为空时根据首行数据判断
+        """
+        from .columnar import ColumnData
+
+        return ColumnData.from_rows(self, header, types)
+
     def print(self, format_spec, sep=" ", print_rows: bool = True):
+        self._compile()
         tprint(
             self._data, format_spec=format_spec, sep=sep, print_rows=print_rows
         )
@@ -214,9 +465,18 @@ class Data:
 
         data = defaultdict(lambda: [])
         for row in self:
-            data[key[row]].append(row)
+            data[key(row)].append(row)
         return data.items()
 
+    def aggregate(self, key, *aggs, sorted: bool = False) -> Iterable[list]:
+        """
+        流式分组汇总，每组仅保存汇总值，参见 aggregate 模块，使用方法：
+        Data(rows).aggregate(0, Count(), Sum(2), Distinct(1))
+        """
+        from .aggregate import aggregate
+
+        return aggregate(self, key, *aggs, sorted=sorted)
+
     def show(self, limit=5):
         "打印指定行的数据"
         for _, row in zip(range(5), self):
@@ -7,6 +7,7 @@
 # 修改：2018-09-09 新增 tprint 功能
 # 修改：2018-09-12 10:19 新增 shell、cformat、tprint 功能
 # 修订：2021-06-14 17:25 新增 get_md5 函数
+# 修订：2026-10-17 18:08 新增 pool_starmap，在进程池中按有限窗口提交任务
 
 import os
 import uuid
@@ -14,7 +15,7 @@ import warnings
 from functools import wraps
 from hashlib import md5
 from itertools import islice
-from typing import Iterable
+from typing import Callable, Iterable, Iterator, Optional
 
 from .datetime_ import datetime
 from .regex import R
@@ -372,6 +373,53 @@ def split(data: Iterable, size: int = 1000) -> Iterable:
         yield row
 
 
+def pool_starmap(
+    func: Callable,
+    iterable: Iterable[tuple],
+    workers: Optional[int] = None,
+    ordered: bool = True,
+    initializer: Optional[Callable] = None,
+    initargs: tuple = (),
+) -> Iterator[tuple]:
+    """
+    在进程池中执行 func(*args)，返回：(args, 结果)。任务逐个提交，
+    未取走的结果最多为进程数的两倍，内存占用与任务数量无关
+    workers: 进程数，默认为 CPU 核数
+    ordered: 是否按提交的顺序返回，否则按完成的顺序返回
+    """
+    from collections import deque
+    from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+    workers = workers or os.cpu_count() or 1
+    iterable = iter(iterable)
+    with ProcessPoolExecutor(
+        workers, initializer=initializer, initargs=initargs
+    ) as pool:
+        tasks = {}
+
+        def submit():
+            if (args := next(iterable, None)) is not None:
+                future = pool.submit(func, *args)
+                tasks[future] = args
+                return future
+
+        pending = deque(filter(None, (submit() for _ in range(workers * 2))))
+        if ordered:
+            while pending:
+                future = pending.popleft()
+                if new := submit():
+                    pending.append(new)
+                yield tasks.pop(future), future.result()
+        else:
+            pending = set(pending)
+            while pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    if new := submit():
+                        pending.add(new)
+                    yield tasks.pop(future), future.result()
+
+
 def groupby(data: Iterable, key) -> Iterable:
     "对数据进行分组，key 可以为列数，也可以是函数"
     from collections import defaultdict
@@ -9,17 +9,23 @@
 # 修订：2019-12-29 22:00 为 add_table 新增默认值
 # 修订：2021-08-15 15:27 新增 Style class
 # 修改：2023-05-31 11:26 Header 增加 formula 参数的说明
+# 修订：2026-10-17 17:34 新增 write_table，支持 constant_memory 模式下流式写入
+# 修订：2026-10-17 18:12 write_table 用到的 xlsxwriter 内部接口集中到 _xlsxwriter_* 函数
 
 
+from collections import defaultdict
 from dataclasses import dataclass
 from functools import partial
-from typing import Optional
+from itertools import chain, islice
+from typing import Iterable, Optional
 
 from xlsxwriter import Workbook
 from xlsxwriter.worksheet import (
     CellBlankTuple,
+    CellFormulaTuple,
     Worksheet,
     convert_range_args,
+    xl_cell_to_rowcol,
     xl_col_to_name,
 )
 
@@ -28,6 +34,8 @@ from orange import Path, R
 Pattern = R / r"([A-Z]{1,2})(\d*)([:_]([A-Z]{1,2})(\d*))?"
 Row = R / r"(\{([+-]?\d+)\})"
 
+MAX_ROWS = 1048576  # Excel 工作表的最大行数
+
 
 @dataclass
 class Style:
@@ -359,6 +367,127 @@ class Book(Workbook):
         worksheet = sheet or worksheet
         self._add_table(pos, worksheet=worksheet, data=data, **kw)
 
+    def _conv_columns(self, columns, first_col, header_format="header"):
+        """转换表格的列定义，并设置列宽及隐藏列"""
+        if isinstance(columns, str):
+            columns = columns.split(",")  # columns 支持以,分割的字符串
+        new_columns = []
+        for idx, column in enumerate(columns):
+            if isinstance(column, str):
+                column = Header(column)
+            elif isinstance(column, int):
+                column = Header(f"Column{column}")
+            new_column = column.copy()
+            width = new_column.pop("width", None)
+            hidden = new_column.pop("hidden", None)
+            if width or hidden:
+                self.set_columns(
+                    "{0}:{0}".format(xl_col_to_name(idx + first_col)),
+                    width=width,
+                    options={"hidden": hidden},
+                )
+            if format := new_column.get("format"):
+                if isinstance(format, str):
+                    new_column["format"] = self._formats.get(format)
+            if hformat := new_column.get("header_format"):
+                if isinstance(hformat, str):
+                    new_column["header_format"] = self._formats.get(hformat)
+            new_columns.append(new_column)
+        if header_format:
+            if isinstance(header_format, str):
+                header_format = self._formats.get(header_format)
+            for column in new_columns:
+                column["header_format"] = header_format
+        return new_columns
+
+    def write_table(
+        self,
+        pos="A1",
+        sheet=None,
+        worksheet=None,
+        data: Iterable = (),
+        header_format="header",
+        **kw,
+    ) -> int:
+        """逐行写入表格，参数同 add_table，返回写入的行数。
+        数据不会整体读入内存，与 constant_memory 模式配合使用可以导出大量数据：
+        with Book(path, options={"constant_memory": True}) as book:
+            book.write_table(data=data, columns=columns)
+        超出 Excel 最大行数时，自动拆分到新的工作表，表名为：原表名_2、原表名_3 ...
+        """
+        first_row, first_col = xl_cell_to_rowcol(pos.upper())
+        data = iter(data)
+        count, part = 0, 1
+        capacity = MAX_ROWS - first_row - 1
+        if kw.get("total_row", False):
+            capacity -= 1
+        name = sheet or worksheet
+        while True:
+            self.worksheet = name if part == 1 else f"{name}_{part}"
+            if part == 1:
+                name = self.worksheet.name
+            rows = self._write_table(
+                first_row,
+                first_col,
+                islice(data, capacity),
+                header_format=header_format,
+                **kw,
+            )
+            count += rows
+            if rows < capacity or (first := next(data, None)) is None:
+                break
+            data = chain([first], data)
+            part += 1
+        return count
+
+    def _write_table(self, first_row, first_col, data, header_format, **kw):
+        """在当前工作表中逐行写入数据，最后添加表格定义"""
+        worksheet = self.worksheet
+        data = iter(data)
+        first = next(data, None)
+        columns = kw.get("columns")
+        if not columns:
+            columns = [f"Column{i}" for i in range(1, len(first or ()) + 1)]
+            if not columns:  # 无数据，也无表头，不添加表格
+                return 0
+        columns = self._conv_columns(columns, first_col, header_format)
+        kw["columns"] = columns
+        last_col = first_col + len(columns) - 1
+        formats = [column.get("format") for column in columns]
+        formulas = {}  # 公式列，需在每一行写入
+        for idx, column in enumerate(columns):
+            if formula := column.get("formula"):
+                formulas[idx] = _xlsxwriter_table_formula(worksheet, formula)
+
+        for idx, column in enumerate(columns, first_col):
+            worksheet.write_string(
+                first_row,
+                idx,
+                column.get("header", f"Column{idx - first_col + 1}"),
+                column.get("header_format"),
+            )
+        row_num = first_row
+        for row_num, row in enumerate(
+            chain([first], data) if first is not None else (), first_row + 1
+        ):
+            for idx, value in enumerate(row):
+                worksheet.write(row_num, first_col + idx, value, formats[idx])
+            for idx, formula in formulas.items():
+                _xlsxwriter_write_formula(
+                    worksheet, row_num, first_col + idx, formula, formats[idx]
+                )
+        count = row_num - first_row
+        last_row = first_row + max(count, 1)
+        if kw.get("total_row", False):
+            last_row += 1
+        if worksheet.constant_memory:
+            _xlsxwriter_add_table(
+                worksheet, first_row, first_col, last_row, last_col, kw
+            )
+        else:
+            worksheet.add_table(first_row, first_col, last_row, last_col, kw)
+        return count
+
     @convert_range_args
     def _add_table(
         self,
@@ -374,39 +503,11 @@ class Book(Workbook):
         """添加图表，如sheet为空，则使用默认的工作表"""
         self.worksheet = worksheet
         columns = kwargs.get("columns")
-        if isinstance(columns, str):
-            columns = columns.split(",")  # columns 支持以,分割的字符串
         if columns:
-            new_columns = []
-            for idx, column in enumerate(columns):
-                if isinstance(column, str):
-                    column = Header(column)
-                elif isinstance(column, int):
-                    column = Header(f"Column{column}")
-                new_column = column.copy()
-                width = new_column.pop("width", None)
-                hidden = new_column.pop("hidden", None)
-                if width or hidden:
-                    self.set_columns(
-                        "{0}:{0}".format(xl_col_to_name(idx + first_col)),
-                        width=width,
-                        options={"hidden": hidden},
-                    )
-                if format := new_column.get("format"):
-                    if isinstance(format, str):
-                        new_column["format"] = self._formats.get(format)
-                if hformat := new_column.get("header_format"):
-                    if isinstance(hformat, str):
-                        new_column["header_format"] = self._formats.get(
-                            hformat)
-                new_columns.append(new_column)
-            if header_format:
-                if isinstance(header_format, str):
-                    header_format = self._formats.get(header_format)
-                for column in new_columns:
-                    column["header_format"] = header_format
-            kwargs["columns"] = new_columns
-            last_col = first_col + len(columns) - 1
+            kwargs["columns"] = self._conv_columns(
+                columns, first_col, header_format
+            )
+            last_col = first_col + len(kwargs["columns"]) - 1
         if data:
             if not isinstance(data, (tuple, list)):
                 data = tuple(data)
@@ -419,6 +520,55 @@ class Book(Workbook):
         )
 
 
+# 以下函数使用了 xlsxwriter 的内部接口，pyproject.toml 中限定了 xlsxwriter 的版本，
+# 升级 xlsxwriter 时需检查：Worksheet._prepare_table_formula、_prepare_formula、
+# _write_formula 方法，以及 constant_memory、table（未写出的单元格）属性
+
+
+def _xlsxwriter_table_formula(worksheet: Worksheet, formula: str) -> str:
+    "将表格列的公式转换成单元格公式，如 [@金额] 转换成 Table1[[#This Row],[金额]]"
+    formula = worksheet._prepare_table_formula(formula.lstrip("="))
+    return worksheet._prepare_formula(formula, True)
+
+
+def _xlsxwriter_write_formula(worksheet: Worksheet, row, col, formula, cell_format):
+    "写入已转换的公式，不再逐行转换"
+    worksheet._write_formula(row, col, formula, cell_format)
+
+
+def _xlsxwriter_add_table(
+    worksheet: Worksheet, first_row, first_col, last_row, last_col, options
+):
+    """
+    constant_memory 模式不支持 add_table，已写入的单元格也无法修改，
+    故临时关闭该模式，仅添加表格定义，丢弃 add_table 写入的单元格，
+    再按 constant_memory 模式写入汇总行
+    """
+    constant_memory = worksheet.constant_memory
+    table, worksheet.table = worksheet.table, defaultdict(dict)
+    worksheet.constant_memory = 0
+    try:
+        worksheet.add_table(first_row, first_col, last_row, last_col, options)
+    finally:
+        cells, worksheet.table = worksheet.table, table
+        worksheet.constant_memory = constant_memory
+    if not options.get("total_row", False):
+        return
+    columns = options["columns"]
+    definition = worksheet.tables[-1]["columns"]
+    for idx, column in enumerate(definition):
+        cell = cells[last_row].get(first_col + idx)
+        if isinstance(cell, CellFormulaTuple):
+            worksheet._write_formula(last_row, first_col + idx, *cell)
+        elif column["total_string"]:
+            worksheet.write_string(
+                last_row,
+                first_col + idx,
+                column["total_string"],
+                columns[idx].get("format"),
+            )
+
+
 def write_excel(
     filename: str | Path | None = None, formats: Optional[dict] = {}, **kw
 ) -> Book: